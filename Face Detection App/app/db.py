@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.config import settings
+from app.utils.metrics import MongoCommandListener
 from motor.motor_asyncio import AsyncIOMotorDatabase
 class Database:
     client: AsyncIOMotorClient = None
@@ -8,7 +9,7 @@ db = Database()
 
 async def connect_to_mongo():
     # print(f"Connecting to MongoDB at: {settings.mongo_url}")
-    db.client = AsyncIOMotorClient(settings.mongo_url)  # Use from settings
+    db.client = AsyncIOMotorClient(settings.mongo_url, event_listeners=[MongoCommandListener()])  # Use from settings
     # await db.client.server_info()
     print(f"Connected successfully to {settings.mongo_url}")
 
@@ -9,13 +9,46 @@ class Settings(BaseSettings):
     
     # Face recognition settings
     known_faces_dir: str = "known_faces"
+    FACE_ENCODINGS_DIR: str = "face_encodings"  # legacy one-pickle-per-photo layout
+    face_store_dir: str = "face_store"  # binary encoding store, see app/utils/encoding_store.py
     detection_method: str = "hog"
-    frame_scale: float = 0.25
+    frame_scale: float = 0.25  # used as is when adaptive_scaling is off, the upper bound when it is on
     recognition_threshold: float = 0.6
     ear_threshold: float = 0.3
     consec_frames: int = 2
     blink_validity_time: float = 8.0
     show_fps: bool = True
+
+    # Face index: "brute" (exact), "ivf" (k-means partitions) or "balltree" (needs scikit-learn)
+    face_index: str = "brute"
+    ivf_nlist: int = 0  # 0 picks sqrt(gallery size)
+    ivf_nprobe: int = 8  # partitions scanned per query; higher trades latency for recall
+    # "photo" matches every enrolled photo; "identity" matches one centroid per guest, then its templates
+    match_strategy: str = "photo"
+    identity_templates: int = 3  # medoid photos kept per guest
+    identity_shortlist: int = 5  # guests refined after the centroid pass
+    frame_workers: int = 0  # processes analysing websocket frames, 0 = one per CPU
+    frame_queue_size: int = 0  # frames queued or in progress across all cameras, 0 = 2 per worker
+    password_workers: int = 0  # threads running bcrypt for login and registration, 0 = one per CPU
+    password_queue_size: int = 0  # bcrypt operations queued or in progress, 0 = 4 per thread
+    detect_every_frames: int = 5  # full detection + encoding every N frames, landmarks-only tracking in between
+    track_iou_threshold: float = 0.3  # min box overlap to keep following a face
+    reservation_cache_ttl: float = 30.0  # seconds a recognized guest's reservations are reused
+    reservation_cache_size: int = 1024
+    user_cache_ttl: float = 60.0  # seconds an authenticated user's document is reused
+    user_cache_size: int = 4096
+    adaptive_scaling: bool = True  # pick frame scale from resolution and load, see app/utils/adaptive.py
+    min_face_fraction: float = 0.3  # smallest face to recognize, as a fraction of the frame height (a guest at the desk)
+    detector_min_face: int = 40  # face height in pixels the detector still finds after scaling
+    min_frame_scale: float = 0.1
+    max_frame_scale: float = 1.0
+    frame_budget_ms: float = 150.0  # detection frames slower than this lower the quality
+    max_cameras_per_socket: int = 16  # cameras one /ws/face/multi connection may carry
+    motion_gate: bool = True  # skip detection on unchanged frames while no face is tracked
+    motion_threshold: float = 4.0  # mean grey-level change on a 32x24 thumbnail that counts as motion
+    motion_max_idle: float = 2.0  # seconds after which a frame is analysed even without motion
+    enrollment_workers: int = 1  # registrations encoded concurrently in the background
+    stats_rollup: bool = False  # keep daily reservation totals for the dashboard, see app/utils/stats.py
     
     class Config:
         env_file = ".env"
@@ -1,11 +1,23 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from app.utils.security import get_current_user
 from app.db import get_database
+from app.utils.gallery import gallery
+from app.utils.camera_session import live_sessions
+from app.utils.ingest import ingestors
+from app.utils.profiler import SessionProfiler
+from app.utils import stats as daily_stats
+from app.config import settings
+from app.schemas import StreamCreate
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 router = APIRouter()
 
+MAX_PROFILE_SECONDS = 120
+
 @router.get("/stats")
 async def get_system_stats(current_user: dict = Depends(get_current_user)):
     db = get_database()
@@ -14,35 +26,153 @@ async def get_system_stats(current_user: dict = Depends(get_current_user)):
     if current_user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Forbidden")
     
-    # Calculate stats
-    stats = {
-        "total_guests": await db["users"].count_documents({}),
-        "occupied_rooms": await db["rooms"].count_documents({"status": {"$ne": "available"}}),
-        "available_rooms": await db["rooms"].count_documents({"status": "available"}),
-        "today_check_ins": await db["reservations"].count_documents({
-            "check_in_date": {"$lte": datetime.now()},
-            "check_out_date": {"$gt": datetime.now()},
-            "status": "checked-in"
-        }),
-        "today_check_outs": await db["reservations"].count_documents({
-            "check_out_date": {"$gte": datetime.now(), "$lt": datetime.now() + timedelta(days=1)},
-            "status": "checked-in"
-        }),
-        "monthly_revenue": await calculate_monthly_revenue(db)
-    }
-    
+    # The queries run concurrently instead of one after another. Reservation
+    # dates are stored in UTC, and the rollup counts UTC months too
+    now = datetime.now(timezone.utc)
+    queries = [
+        db["users"].count_documents({}),
+        count_rooms(db),
+        reservation_stats(db, now, revenue=not settings.stats_rollup),
+    ]
+    if settings.stats_rollup:
+        queries.append(daily_stats.month_revenue(db, now))
+    total_guests, rooms, reservations, *rollup = await asyncio.gather(*queries)
+    if rollup:
+        reservations["monthly_revenue"] = rollup[0]
+
+    stats = {"total_guests": total_guests, **rooms, **reservations}
     return stats
 
-async def calculate_monthly_revenue(db):
-    # Calculate revenue for current month
-    start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    reservations = db["reservations"].find({
-        "check_out_date": {"$gte": start_of_month},
-        "status": {"$in": ["confirmed", "checked-in", "checked-out"]}
-    })
-    
-    total = 0
-    async for res in reservations:
-        total += res["total_amount"]
-    
-    return total
\ No newline at end of file
+async def count_rooms(db):
+    pipeline = [
+        {"$group": {
+            "_id": None,
+            "available_rooms": {"$sum": {"$cond": [{"$eq": ["$status", "available"]}, 1, 0]}},
+            "occupied_rooms": {"$sum": {"$cond": [{"$eq": ["$status", "available"]}, 0, 1]}},
+        }},
+    ]
+    async for row in db["rooms"].aggregate(pipeline):
+        return {"occupied_rooms": row["occupied_rooms"], "available_rooms": row["available_rooms"]}
+    return {"occupied_rooms": 0, "available_rooms": 0}
+
+async def reservation_stats(db, now, revenue=True):
+    """Today's check-ins and check-outs, and optionally the month's revenue, in one $facet aggregation."""
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    facets = {
+        "today_check_ins": [
+            {"$match": {"check_in_date": {"$lte": now}, "check_out_date": {"$gt": now}, "status": "checked_in"}},
+            {"$count": "n"},
+        ],
+        "today_check_outs": [
+            {"$match": {"check_out_date": {"$gte": now, "$lt": now + timedelta(days=1)}, "status": "checked_in"}},
+            {"$count": "n"},
+        ],
+    }
+    if revenue:
+        facets["monthly_revenue"] = [
+            {"$match": {"status": {"$in": daily_stats.REVENUE_STATUSES}}},
+            {"$group": {"_id": None, "n": {"$sum": "$total_amount"}}},
+        ]
+    pipeline = [
+        # Every facet only wants stays ending this month or later, so the check_out_date index bounds the scan
+        {"$match": {"check_out_date": {"$gte": start_of_month}}},
+        {"$facet": facets},
+    ]
+    async for row in db["reservations"].aggregate(pipeline):
+        return {name: values[0]["n"] if values else 0 for name, values in row.items()}
+
+@router.post("/gallery/reload")
+async def reload_face_gallery(current_user: dict = Depends(get_current_user)):
+    """
+    Re-read all stored face encodings into the shared gallery (admin only)
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    loaded = await run_in_threadpool(gallery.reload)
+    return {"loaded": loaded, "version": gallery.version}
+
+
+@router.get("/streams")
+async def list_streams(current_user: dict = Depends(get_current_user)):
+    """
+    Server-side camera ingestors and their throughput (admin only)
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return ingestors.list()
+
+
+@router.post("/streams")
+async def start_stream(stream: StreamCreate, current_user: dict = Depends(get_current_user)):
+    """
+    Start recognizing an RTSP stream or video file on the server (admin only);
+    results are published on /ws/face/streams/{camera_id}
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    ingestor = await ingestors.start(stream.camera_id, stream.source, get_database(), stream.realtime)
+    return ingestor.status()
+
+
+@router.delete("/streams/{camera_id}")
+async def stop_stream(camera_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Stop a server-side camera ingestor (admin only)
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    ingestor = await ingestors.stop(camera_id)
+    if ingestor is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return ingestor.status()
+
+
+@router.get("/sessions")
+async def list_face_sessions(current_user: dict = Depends(get_current_user)):
+    """
+    Open face recognition sessions, one per camera (admin only)
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return [session.info() for session in live_sessions.values()]
+
+
+@router.post("/sessions/{session_id}/profile")
+async def profile_face_session(
+    session_id: str,
+    seconds: float = 10.0,
+    interval_ms: float = 5.0,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Sample one face session's stacks for the given seconds and return them
+    as a collapsed-stack file for flamegraph.pl or speedscope (admin only)
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    session = live_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.profiler is not None:
+        raise HTTPException(status_code=409, detail="Session is already being profiled")
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or interval_ms < 1:
+        raise HTTPException(status_code=400, detail=f"Profile for up to {MAX_PROFILE_SECONDS} seconds, at least 1 ms apart")
+
+    profiler = SessionProfiler(seconds, interval_ms / 1000.0).start()
+    session.profiler = profiler
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        session.profiler = None
+        stacks = profiler.finish()
+
+    return PlainTextResponse(
+        stacks,
+        headers={"Content-Disposition": f'attachment; filename="face-{session_id}.collapsed"'},
+    )
@@ -1,14 +1,9 @@
-import os
-import uuid
-from datetime import datetime, timedelta
-from pathlib import Path
+from datetime import timedelta
 from typing import List
 
-import cv2
 from fastapi import (
     APIRouter,
     Depends,
-    FastAPI,
     File,
     Form,
     HTTPException,
@@ -17,17 +12,20 @@ from fastapi import (
 )
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
-from jose import JWTError, jwt
+from jose import JWTError
 
 from app.db import get_database
 from app.models import User
-from app.schemas import Token, UserCreate, UserResponse
-from app.utils.security import (
-    create_access_token,
-    get_password_hash,
-    verify_password,
+from app.schemas import (
+    EnrollmentJobResponse,
+    RegisterResponse,
+    Token,
+    UserResponse,
 )
-from app.utils.face_utils import encode_face
+from app.utils.security import create_access_token
+from app.utils.enrollment import enrollment_jobs
+from app.utils.password_pool import password_pool
+from app.utils.user_cache import decode_token, get_user, invalidate_user
 from app.config import settings
 
 router = APIRouter()
@@ -36,29 +34,17 @@ router = APIRouter()
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 600
+ENROLLMENT_TOKEN_EXPIRE_MINUTES = 15
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-# Upload directory
-UPLOAD_DIR = "uploads"
-Path(UPLOAD_DIR).mkdir(exist_ok=True)
-
-
 class LoginRequest(BaseModel):
     email: str
     password: str
 
 
-import os
-import pickle
-from pathlib import Path
-
-# Add this to your configuration
-FACE_ENCODINGS_DIR = "face_encodings"
-Path(FACE_ENCODINGS_DIR).mkdir(exist_ok=True)
-
-@router.post("/register", response_model=UserResponse)
+@router.post("/register", response_model=RegisterResponse)
 async def register(
     full_name: str = Form(...),
     email: str = Form(...),
@@ -75,71 +61,32 @@ async def register(
     if not photos:
         raise HTTPException(status_code=400, detail="At least one photo is required for face registration")
 
-    photo_urls = []
-    encoding_files = []  # To store paths to encoding files
-    
-    for photo in photos:
-        try:
-            # Save the photo
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            ext = photo.filename.split(".")[-1]
-            filename = f"{timestamp}_{uuid.uuid4().hex[:8]}.{ext}"
-            filepath = os.path.join(UPLOAD_DIR, filename)
-
-            with open(filepath, "wb") as buffer:
-                buffer.write(await photo.read())
-
-            photo_urls.append(f"/{UPLOAD_DIR}/{filename}")
-
-            # Generate and save face encoding
-            image = cv2.imread(filepath)
-            if image is not None:
-                encoding = encode_face(image, settings.detection_method)
-                if encoding is not None:
-                    # Create unique filename for the encoding
-                    encoding_filename = f"{email}_{uuid.uuid4().hex[:8]}.pkl"
-                    encoding_path = os.path.join(FACE_ENCODINGS_DIR, encoding_filename)
-                    
-                    # Save the encoding to a file
-                    with open(encoding_path, 'wb') as f:
-                        pickle.dump({
-                            'encoding': encoding,
-                            'name': full_name,
-                            'email': email,
-                            'photo_url': f"/{UPLOAD_DIR}/{filename}"
-                        }, f)
-                    
-                    encoding_files.append(encoding_filename)
-                else:
-                    print(f"No face detected in photo: {photo.filename}")
-            else:
-                print(f"Failed to read image: {filepath}")
-
-        except Exception as e:
-            print(f"Failed to process photo: {e}")
-
-    if not encoding_files:
-        raise HTTPException(
-            status_code=400, 
-            detail="No faces detected in the provided photos. Please upload clear photos with visible faces."
-        )
-
-    hashed_password = get_password_hash(password)
+    uploads = [(photo.filename, await photo.read()) for photo in photos]
+    hashed_password = await password_pool.hash(password)
 
     user_data = User(
         full_name=full_name,
         email=email,
         hashed_password=hashed_password,
         phone=phone,
-        photo_urls=photo_urls,
-        encoding_files=encoding_files,  # Store paths to encoding files
         role="user",
     )
 
     result = await db["users"].insert_one(user_data.dict(by_alias=True, exclude={"id"}))
     new_user = await db["users"].find_one({"_id": result.inserted_id})
 
-    return UserResponse(id=str(new_user["_id"]), **new_user)
+    # Face encoding runs in the background; clients poll /enrollment/{job_id} with the returned token
+    job_id, photo_urls = await enrollment_jobs.submit(str(result.inserted_id), full_name, email, uploads)
+    await db["users"].update_one({"_id": result.inserted_id}, {"$set": {"photo_urls": photo_urls}})
+    invalidate_user(email)
+
+    access_token = create_access_token(
+        data={"sub": email, "role": "user"},
+        expires_delta=timedelta(minutes=ENROLLMENT_TOKEN_EXPIRE_MINUTES),
+    )
+    return RegisterResponse(
+        id=str(new_user["_id"]), enrollment_job_id=job_id, access_token=access_token, **new_user
+    )
 
 
 @router.post("/login", response_model=Token)
@@ -147,7 +94,7 @@ async def login(login_data: LoginRequest):
     db = get_database()
     user = await db["users"].find_one({"email": login_data.email})
 
-    if not user or not verify_password(login_data.password, user["hashed_password"]):
+    if not user or not await password_pool.verify(login_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -176,7 +123,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     )
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token, SECRET_KEY, ALGORITHM)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -184,13 +131,42 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
 
     db = get_database()
-    user = await db["users"].find_one({"email": email})
+    user = await get_user(db, email)
     if user is None:
         raise credentials_exception
 
     user["id"] = str(user["_id"])
     return UserResponse(**user)
 
+@router.get("/enrollment/{job_id}", response_model=EnrollmentJobResponse)
+async def get_enrollment_status(job_id: str, token: str = Depends(oauth2_scheme)):
+    # Checked against the token alone: a failed enrollment removes the account it was for
+    try:
+        claims = decode_token(token, settings.secret_key, settings.algorithm)
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    db = get_database()
+    job = await db["enrollment_jobs"].find_one({"_id": job_id})
+    # Someone else's job looks the same as a missing one
+    if job is None or (claims.get("sub") != job["email"] and claims.get("role") != "admin"):
+        raise HTTPException(status_code=404, detail="Enrollment job not found")
+
+    statuses = [photo["status"] for photo in job["photos"]]
+    return EnrollmentJobResponse(
+        id=job["_id"],
+        user_id=job["user_id"],
+        status=job["status"],
+        photos=job["photos"],
+        encoded=statuses.count("encoded"),
+        failed=statuses.count("failed"),
+        error=job.get("error"),
+    )
+
 @router.get("/me", response_model=UserResponse)
 async def read_current_user(current_user: UserResponse = Depends(get_current_user)):
     return current_user
@@ -1,84 +1,179 @@
-import numpy as np
-import cv2
-import time
-from collections import defaultdict
-from fastapi import WebSocket, APIRouter
+import asyncio
+from fastapi import WebSocket, WebSocketDisconnect, APIRouter
+from jose import JWTError
+from starlette.websockets import WebSocketState
 from app.config import settings
-from app.utils.face_utils import load_known_faces, process_frame
+from app.utils.camera_session import CameraSession
+from app.utils.frame_slot import LatestFrameSlot
+from app.utils.ingest import ingestors
+from app.utils.protocol import ResultChannel
+from app.utils.user_cache import decode_token, get_user
 from app.db import get_database
 
 router = APIRouter()
 
+async def receive_frames(websocket: WebSocket, slot: LatestFrameSlot):
+    """Read frames as fast as the client sends them, keeping only the newest."""
+    try:
+        while True:
+            slot.put(await websocket.receive_bytes())
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"[WebSocket Error]: {e}")
+    finally:
+        slot.close()
+
+
+def split_camera_frame(message):
+    """Split a multiplexed message into (camera_id, frame).
+
+    Layout: one byte with the id's length, the UTF-8 camera id, then the
+    encoded image. Returns (None, None) for a malformed message.
+    """
+    if not message:
+        return None, None
+    end = 1 + message[0]
+    if end >= len(message):
+        return None, None
+    try:
+        return message[1:end].decode("utf-8"), message[end:]
+    except UnicodeDecodeError:
+        return None, None
+
+
+async def receive_camera_frames(websocket: WebSocket, open_session):
+    """Route each tagged frame to its camera's slot, opening sessions for new cameras."""
+    try:
+        while True:
+            camera_id, frame = split_camera_frame(await websocket.receive_bytes())
+            if camera_id is None:
+                continue  # Skip malformed message
+            session = open_session(camera_id)
+            if session is not None:
+                session.slot.put(frame)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"[WebSocket Error]: {e}")
+
+
+async def is_admin(token):
+    """Whether a bearer token belongs to an admin; for sockets, which cannot use the OAuth2 dependency."""
+    if not token:
+        return False
+    try:
+        email = decode_token(token, settings.secret_key, settings.algorithm).get("sub")
+    except JWTError:
+        return False
+    user = await get_user(get_database(), email) if email else None
+    return user is not None and user.get("role") == "admin"
+
+
+async def close_socket(websocket: WebSocket):
+    if websocket.client_state == WebSocketState.CONNECTED:
+        await websocket.close()
+
+
 @router.websocket("")
 async def websocket_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    session = CameraSession(get_database(), ResultChannel.negotiate(websocket), client=client)
+
+    # Latest frame wins: a receive task drops frames that arrive while one is processed
+    receiver = asyncio.create_task(receive_frames(websocket, session.slot))
+
+    try:
+        await session.run()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"[WebSocket Error]: {e}")
+    finally:
+        receiver.cancel()
+        session.close()
+        await close_socket(websocket)
+
+
+@router.websocket("/multi")
+async def multi_camera_endpoint(websocket: WebSocket):
+    """Several cameras over one socket: frames are tagged with a camera id, results carry "camera".
+
+    Each camera gets its own CameraSession and processing task, all
+    feeding the shared frame pool; results are sent as they finish. A camera
+    whose task fails is sent {"camera": id, "error": ...} and starts over
+    with a fresh session on its next frame.
+    """
     await websocket.accept()
     db = get_database()
+    client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    send_lock = asyncio.Lock()
+    sessions, tasks = {}, []
 
-    known_encs, known_names, known_emails = load_known_faces()
-    close_counts = defaultdict(int)
-    last_blink_time = {}
+    def open_session(camera_id):
+        session = sessions.get(camera_id)
+        if session is None:
+            if len(sessions) >= settings.max_cameras_per_socket:
+                return None  # Ignore cameras beyond the limit
+            channel = ResultChannel.negotiate(websocket, send_lock)
+            session = sessions[camera_id] = CameraSession(db, channel, camera_id, client)
+            tasks.append(asyncio.create_task(run_camera(session, sessions)))
+        return session
 
     try:
-        while True:
-            data = await websocket.receive_bytes()
-            nparr = np.frombuffer(data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-            if frame is None:
-                continue  # Skip invalid frame
-
-            locs, fnames, ears, emails = process_frame(
-                frame,
-                known_encs,
-                known_names,
-                known_emails,
-                settings.frame_scale,
-                settings.detection_method,
-                settings.recognition_threshold,
-            )
-
-            current_time = time.time()
-            results = []
-
-            for (t, r, b, l), name, ear, email in zip(locs, fnames, ears, emails):
-                status = "Not Live"
-                reservations = []
-
-                if ear is not None and name != "Unknown":
-                    if ear < settings.ear_threshold:
-                        close_counts[name] += 1
-                    else:
-                        if close_counts[name] >= settings.consec_frames:
-                            last_blink_time[name] = current_time
-                        close_counts[name] = 0
-
-                    if name in last_blink_time and (current_time - last_blink_time[name]) <= settings.blink_validity_time:
-                        status = "Live"
-
-                if email:
-                    user = await db["users"].find_one({"email": email})
-                    if user:
-                        user_id = str(user["_id"])
-                        async for res in db["reservations"].find({"user_id": user_id}):
-                            reservations.append({
-                                "id": str(res["_id"]),
-                                "room_id": res["room_id"],
-                                "check_in_date": res["check_in_date"].isoformat(),
-                                "check_out_date": res["check_out_date"].isoformat(),
-                                "status": res.get("status", "active")
-                            })
-                
-                results.append({
-                    "name": name,
-                    "email": email,
-                    "status": status,
-                    "bbox": [int(l), int(t), int(r), int(b)],
-                    "reservations": reservations
-                })
-
-            await websocket.send_json(results)
+        await receive_camera_frames(websocket, open_session)
+    finally:
+        for session in sessions.values():
+            session.slot.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for session in sessions.values():
+            session.close()
+        await close_socket(websocket)
 
+
+async def run_camera(session: CameraSession, sessions: dict):
+    try:
+        await session.run()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"[WebSocket Error] camera {session.camera_id}: {e}")
+        # Stop routing frames to the dead session and tell the client
+        if sessions.get(session.camera_id) is session:
+            del sessions[session.camera_id]
+        session.slot.close()
+        session.close()
+        try:
+            await session.channel.send({"camera": session.camera_id, "error": str(e)})
+        except Exception:
+            pass  # The socket itself is gone
+
+
+@router.websocket("/streams/{camera_id}")
+async def stream_results_endpoint(websocket: WebSocket, camera_id: str):
+    """Results of a server-side ingestor (see /api/admin/streams), in the negotiated format.
+
+    Admins only: pass the access token as ?token=...
+    """
+    await websocket.accept()
+    if not await is_admin(websocket.query_params.get("token")):
+        await websocket.close(code=4403)
+        return
+    ingestor = ingestors.get(camera_id)
+    if ingestor is None:
+        await websocket.close(code=4404)
+        return
+
+    channel = ResultChannel.negotiate(websocket)
+    results = ingestor.publisher.subscribe()
+    try:
+        while True:
+            await channel.send(await results.get())
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         print(f"[WebSocket Error]: {e}")
     finally:
-        await websocket.close()
+        ingestor.publisher.unsubscribe(results)
+        await close_socket(websocket)
@@ -3,6 +3,8 @@ from pydantic import BaseModel
 from datetime import datetime, timezone
 from app.db import get_database
 from app.utils.security import get_current_user
+from app.utils.guest_cache import invalidate_guest
+from app.utils.stats import record_booking
 from bson import ObjectId
 from typing import List
 
@@ -70,6 +72,7 @@ async def check_in(
     
     if update_result.modified_count == 0:
         raise HTTPException(status_code=500, detail="Failed to update reservation")
+    invalidate_guest(request.email, reservation.get("user_id"))
     
     # Get updated reservation
     updated_reservation = await db["reservations"].find_one({"_id": ObjectId(request.reservation_id)})
@@ -122,6 +125,7 @@ async def check_out(
     
     if update_result.modified_count == 0:
         raise HTTPException(status_code=500, detail="Failed to update reservation")
+    invalidate_guest(request.email, reservation.get("user_id"))
     
     # Get updated reservation
     updated_reservation = await db["reservations"].find_one({"_id": ObjectId(request.reservation_id)})
@@ -186,6 +190,8 @@ async def create_reservation(
     }
 
     await db["reservations"].insert_one(reservation_data)
+    invalidate_guest(current_user.get("email"), reservation_data["user_id"])
+    await record_booking(db, check_out, reservation_data.get("total_amount", 0))
 
     return JSONResponse(status_code=200, content={"message": "Reservation successful"})
 
@@ -21,6 +21,25 @@ class UserResponse(BaseModel):
     email: str
     role: str
 
+class RegisterResponse(UserResponse):
+    enrollment_job_id: str
+    access_token: str  # short-lived, to poll the enrollment job
+
+class EnrollmentPhotoStatus(BaseModel):
+    filename: str
+    photo_url: str
+    status: str  # pending, encoded, failed
+    error: Optional[str] = None
+
+class EnrollmentJobResponse(BaseModel):
+    id: str
+    user_id: str
+    status: str  # queued, processing, completed, failed
+    photos: list[EnrollmentPhotoStatus]
+    encoded: int
+    failed: int
+    error: Optional[str] = None
+
 class RoomCreate(BaseModel):
     room_number: str
     room_type: str
@@ -61,4 +80,9 @@ class SystemStats(BaseModel):
     available_rooms: int
     today_check_ins: int
     today_check_outs: int
-    monthly_revenue: float
\ No newline at end of file
+    monthly_revenue: float
+
+class StreamCreate(BaseModel):
+    camera_id: str
+    source: str  # rtsp:// URL or a video file path on the server
+    realtime: Optional[bool] = None  # defaults to True for streams, False for files
@@ -0,0 +1,96 @@
+from app.config import settings
+
+
+class AdaptiveController:
+    """Picks the frame scale and detection method for one camera and adapts them to load.
+
+    The base scale shrinks each frame until the smallest face worth
+    detecting (min_face_fraction of the frame height) is about
+    detector_min_face pixels tall, so a 4K lobby camera and a 480p webcam
+    cost roughly the same per detection. It never exceeds frame_scale, so
+    turning adaptive scaling on never makes a camera dearer than the fixed
+    scale did. Detection frames that take longer
+    than the time budget lower the scale step by step. At the floor, a
+    configured "cnn" detector falls back to "hog", and after that frames
+    are skipped. Frames well under budget undo these steps in reverse order.
+    """
+
+    STEP = 0.8  # scale factor per adjustment
+    IDLE = 0.5  # fraction of the budget below which quality is raised again
+    SMOOTHING = 0.3  # weight of the newest frame time in the moving average
+    WINDOW = 5  # frames observed before each adjustment
+    MAX_SKIP = 4  # skipping lightens the shared pool but cannot speed up a single frame
+
+    def __init__(self, detection_method=None, budget_ms=None):
+        self.detection_method = detection_method or settings.detection_method
+        self.budget = (budget_ms or settings.frame_budget_ms) / 1000.0
+        self.method = self.detection_method
+        self.quality = 1.0  # multiplier on the base scale
+        self.skip = 0  # frames dropped after each processed one
+        self.frame_size = None
+        self.avg_time = None
+        self._samples = 0
+        self._to_skip = 0
+
+    @property
+    def scale(self):
+        if not settings.adaptive_scaling:
+            return settings.frame_scale
+        if self.frame_size is None:
+            return settings.frame_scale  # until the first frame has been decoded
+        height = self.frame_size[0]
+        base = min(settings.frame_scale, settings.detector_min_face / (settings.min_face_fraction * height))
+        return min(settings.max_frame_scale, max(settings.min_frame_scale, base * self.quality))
+
+    def should_process(self):
+        if self._to_skip > 0:
+            self._to_skip -= 1
+            return False
+        self._to_skip = self.skip
+        return True
+
+    def record(self, frame_size, elapsed):
+        """Feed back a detection frame's (height, width) and its seconds from submit to result."""
+        self.frame_size = frame_size
+        if not settings.adaptive_scaling:
+            return
+        if self.avg_time is None:
+            self.avg_time = elapsed
+        else:
+            self.avg_time += self.SMOOTHING * (elapsed - self.avg_time)
+        self._samples += 1
+        if self._samples < self.WINDOW:
+            return
+
+        if self.avg_time > self.budget:
+            self._degrade()
+        elif self.avg_time < self.budget * self.IDLE:
+            self._improve()
+        else:
+            return
+        # Judge the new settings on their own frames
+        self.avg_time, self._samples = None, 0
+
+    def _degrade(self):
+        if self.scale > settings.min_frame_scale:
+            self.quality *= self.STEP
+        elif self.method == "cnn":
+            self.method = "hog"
+        elif self.skip < self.MAX_SKIP:
+            self.skip += 1
+
+    def _improve(self):
+        if self.skip:
+            self.skip -= 1
+        elif self.method != self.detection_method:
+            self.method = self.detection_method
+        elif self.quality < 1.0:
+            self.quality = min(1.0, self.quality / self.STEP)
+
+    def effective(self):
+        """The settings the next frame is processed with, as reported to the client."""
+        return {
+            "scale": round(self.scale, 3),
+            "detection_method": self.method,
+            "frame_skip": self.skip,
+        }
@@ -0,0 +1,176 @@
+import sys
+import time
+import uuid
+from collections import defaultdict
+from functools import partial
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.utils.adaptive import AdaptiveController
+from app.utils.face_utils import analysis_scale, analyze_image, analyze_jpeg, downscale, run_timed
+from app.utils.frame_pool import frame_pool
+from app.utils.frame_slot import LatestFrameSlot
+from app.utils.guest_cache import get_guest_reservations
+from app.utils.metrics import frame_stage_seconds, frames_total, observe_stages
+from app.utils.motion import MotionGate
+from app.utils.profiler import run_profiled
+from app.utils.recognizer import recognizer
+from app.utils.tracking import FaceTracker
+
+# Open sessions by id, so admins can find and profile one
+live_sessions = {}
+
+
+class CameraSession:
+    """Everything the face stream keeps per camera: newest-frame slot, tracker, liveness counters,
+    scale controller and motion gate.
+
+    The frame pool, gallery and reservation cache are process-wide, so a
+    socket carrying several cameras just holds one session per camera.
+    """
+
+    def __init__(self, db, channel, camera_id=None, client=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.db = db
+        self.channel = channel
+        self.camera_id = camera_id
+        self.client = client
+        self.started_at = time.time()
+        self.profiler = None  # a SessionProfiler while an admin profiles this session
+        self.slot = LatestFrameSlot()
+        self.tracker = FaceTracker(settings.detect_every_frames, settings.track_iou_threshold)
+        self.controller = AdaptiveController()
+        self.gate = MotionGate()
+        self.close_counts = defaultdict(int)
+        self.last_blink_time = {}
+        self.frames_analysed = 0
+        live_sessions[self.id] = self
+
+    def close(self):
+        live_sessions.pop(self.id, None)
+
+    def info(self):
+        return {
+            "id": self.id,
+            "camera_id": self.camera_id,
+            "client": self.client,
+            "started_at": self.started_at,
+            "profiling": self.profiler is not None and self.profiler.active,
+        }
+
+    async def run(self):
+        """Process the newest frame in the slot until it is closed, sending each result."""
+        while True:
+            data, skipped = await self.slot.get()
+            if data is None:
+                return  # Client went away
+            if skipped:
+                frames_total.inc(skipped, outcome="dropped")
+            message = await self.process(data, skipped)
+            if message is not None:
+                if self.camera_id is not None:
+                    message["camera"] = self.camera_id
+                await self.channel.send(message)
+
+    async def process(self, data, skipped):
+        """Analyse one frame, encoded bytes or a decoded BGR image.
+
+        Returns the result message, or None if the frame is dropped.
+        """
+        profiler = self.profiler if self.profiler is not None and self.profiler.active else None
+        if profiler is None:
+            return await self._process(data, skipped, None)
+        with profiler.scope(sys._getframe()):
+            return await self._process(data, skipped, profiler)
+
+    async def _process(self, data, skipped, profiler):
+        controller, tracker = self.controller, self.tracker
+        if not controller.should_process():
+            frames_total.inc(outcome="throttled")
+            return None  # Over the time budget even at the lowest scale
+
+        # Nobody in view and nothing moved: the last (empty) result still holds
+        if settings.motion_gate and not tracker.tracks and not await run_in_threadpool(self.gate.changed, data):
+            frames_total.inc(outcome="gated")
+            return {"faces": [], "skipped": skipped, "settings": controller.effective()}
+
+        # Full detection + encoding only every few frames; in between just landmarks on tracked boxes
+        known_locations = None if tracker.needs_detection() else tracker.boxes()
+        effective = controller.effective()
+
+        # Decode, detect and encode in a worker process so the event loop stays free
+        if isinstance(data, bytes):
+            analyze = analyze_jpeg
+        else:
+            # Decoded frames (server-side ingest) are shrunk here, so the worker gets only what it analyses
+            data, decoded_scale = await run_in_threadpool(
+                downscale, data, analysis_scale(controller.scale, known_locations)
+            )
+            analyze = partial(analyze_image, decoded_scale=decoded_scale)
+        args = (analyze, data, controller.scale, controller.method, known_locations)
+        started = time.perf_counter()
+        if profiler is None:
+            analysis, timings = await frame_pool.run(run_timed, *args)
+        else:
+            (analysis, timings), stacks = await frame_pool.run(run_profiled, profiler.interval, run_timed, *args)
+            profiler.add(stacks)
+        elapsed = time.perf_counter() - started
+        # Worker stages, plus pickling and waiting for a free worker
+        timings["pool"] = max(0.0, elapsed - sum(timings.values()))
+        observe_stages(timings)
+
+        if analysis is None:
+            frames_total.inc(outcome="invalid")
+            return None  # Skip invalid frame
+        frames_total.inc(outcome="analysed")
+        self.frames_analysed += 1
+
+        locs, encs, ears, marks, frame_size = analysis
+        if known_locations is None:
+            # Only detection frames depend on the scale, so only they steer it
+            controller.record(frame_size, elapsed)
+        if encs is not None:
+            started = time.perf_counter()
+            fnames, emails, _ = recognizer.match(encs, settings.recognition_threshold)
+            frame_stage_seconds.observe(time.perf_counter() - started, stage="match")
+            tracks = tracker.update(locs, marks, fnames, emails)
+        else:
+            tracks = tracker.follow(marks)
+
+        current_time = time.time()
+        results = []
+
+        for track, ear in zip(tracks, ears):
+            (t, r, b, l), name, email = track.box, track.name, track.email
+            status = "Not Live"
+
+            if ear is not None and name != "Unknown":
+                if ear < settings.ear_threshold:
+                    self.close_counts[name] += 1
+                else:
+                    if self.close_counts[name] >= settings.consec_frames:
+                        self.last_blink_time[name] = current_time
+                    self.close_counts[name] = 0
+
+                if name in self.last_blink_time and (current_time - self.last_blink_time[name]) <= settings.blink_validity_time:
+                    status = "Live"
+
+            face = {
+                "track_id": track.id,
+                "name": name,
+                "email": email,
+                "status": status,
+                "bbox": [int(l), int(t), int(r), int(b)],
+            }
+            if self.channel.include_reservations:
+                # Cached per guest, so looking them up every frame is cheap and catches changes
+                started = time.perf_counter()
+                reservations = await get_guest_reservations(self.db, email) if email else []
+                frame_stage_seconds.observe(time.perf_counter() - started, stage="db")
+                if self.channel.reservations_changed(track.id, email, reservations):
+                    face["reservations"] = reservations
+            results.append(face)
+
+        self.channel.retain({track.id for track in tracks})
+        return {"faces": results, "skipped": skipped, "settings": effective}
@@ -0,0 +1,201 @@
+"""Append-only binary store for enrolled face encodings.
+
+Layout of the store directory:
+
+    encodings.f32   raw float32 rows of 128 values, memory-mapped on load
+    metadata.jsonl  one JSON object per row: name, email, photo_url
+    tombstones.txt  row numbers that have been deleted, one per line
+
+Row numbers never change, so they double as stable encoding ids. The
+server's store adopts the old one-pickle-per-photo directory on its first
+write or load, so legacy guests keep their ids ahead of new enrollments. To
+convert a directory by hand run, from the "Face Detection App" directory:
+
+    python -m app.utils.encoding_store migrate --source face_encodings --target face_store
+"""
+import argparse
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.utils.matcher import ENCODING_DIM
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+ROW_BYTES = ENCODING_DIM * np.dtype(np.float32).itemsize
+
+
+class EncodingStore:
+    def __init__(self, directory=None, legacy_dir=None):
+        self._directory = directory
+        self.legacy_dir = legacy_dir  # pickle directory imported ahead of the first row, if any
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return self._directory or settings.face_store_dir
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def exists(self):
+        return os.path.exists(self._path("metadata.jsonl"))
+
+    def __len__(self):
+        return len(self._read_metadata())
+
+    def append(self, encodings, metadata):
+        """Append rows in one write and return their row numbers."""
+        return self._write(encodings, metadata, self.legacy_dir)
+
+    def adopt_legacy(self):
+        """Import the legacy pickle directory if the store was never written; returns the rows imported."""
+        if self.exists() or not _has_pickles(self.legacy_dir):
+            return 0
+        return len(self._write([], [], self.legacy_dir))
+
+    def _write(self, encodings, metadata, legacy_dir=None):
+        """Append rows and return their row numbers. An empty store first takes in
+        legacy_dir's pickles in the same write, so their ids never collide with new rows.
+        """
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if len(encodings) != len(metadata):
+            raise ValueError("Need one metadata entry per encoding")
+        os.makedirs(self.directory, exist_ok=True)
+
+        with self._lock, open(self._path("metadata.jsonl"), "a+", encoding="utf-8") as meta:
+            if fcntl is not None:
+                fcntl.flock(meta, fcntl.LOCK_EX)  # other server processes append too
+            # Rows count as written once their metadata line is. Encodings go
+            # first, so a crash in between leaves only orphaned encoding rows,
+            # which load() ignores and the next append overwrites
+            meta.seek(0)
+            start = sum(1 for line in meta if line.strip())
+            legacy = 0
+            if not start and _has_pickles(legacy_dir):
+                legacy_encodings, legacy_metadata = read_pickles(legacy_dir)
+                legacy = len(legacy_encodings)
+                if legacy:
+                    encodings = np.concatenate(
+                        [np.asarray(legacy_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM), encodings]
+                    )
+                    metadata = legacy_metadata + list(metadata)
+                    print(f"Imported {legacy} legacy encodings from {legacy_dir} into {self.directory}")
+            with open(self._path("encodings.f32"), "r+b" if start else "wb") as data:
+                data.seek(start * ROW_BYTES)
+                data.write(encodings.tobytes())
+                data.truncate()
+            meta.writelines(json.dumps(entry) + "\n" for entry in metadata)
+            meta.flush()
+        return list(range(start + legacy, start + len(encodings)))
+
+    def rows_where(self, key, value):
+        """Live row numbers whose metadata has key == value."""
+        dead = self._read_tombstones()
+        return [
+            row for row, entry in enumerate(self._read_metadata())
+            if entry.get(key) == value and row not in dead
+        ]
+
+    def tombstone(self, rows):
+        """Mark rows as deleted; they are skipped by load()."""
+        if not rows:
+            return
+        with self._lock, open(self._path("tombstones.txt"), "a", encoding="utf-8") as dead:
+            dead.writelines(f"{row}\n" for row in rows)
+
+    def load(self):
+        """Return (ids, encodings, names, emails) for every live row.
+
+        With no tombstones the encodings are a read-only memmap of the data
+        file, so processes loading the same store share its pages.
+        """
+        metadata = self._read_metadata()
+        count = min(len(metadata), self._row_count())
+        if not count:
+            return np.empty(0, dtype=np.int64), np.empty((0, ENCODING_DIM), dtype=np.float32), [], []
+
+        encodings = np.memmap(self._path("encodings.f32"), dtype=np.float32, mode="r",
+                              shape=(count, ENCODING_DIM))
+        dead = self._read_tombstones()
+        ids = np.arange(count)
+        if dead:
+            ids = np.setdiff1d(ids, np.fromiter(dead, dtype=np.int64))
+            encodings = encodings[ids]
+        names = [metadata[i]["name"] for i in ids]
+        emails = [metadata[i]["email"] for i in ids]
+        return ids, encodings, names, emails
+
+    def _row_count(self):
+        path = self._path("encodings.f32")
+        return os.path.getsize(path) // ROW_BYTES if os.path.exists(path) else 0
+
+    def _read_metadata(self):
+        if not self.exists():
+            return []
+        with open(self._path("metadata.jsonl"), encoding="utf-8") as meta:
+            return [json.loads(line) for line in meta if line.strip()]
+
+    def _read_tombstones(self):
+        path = self._path("tombstones.txt")
+        if not os.path.exists(path):
+            return set()
+        with open(path, encoding="utf-8") as dead:
+            return {int(line) for line in dead if line.strip()}
+
+
+def _has_pickles(directory):
+    return bool(directory) and os.path.isdir(directory) and any(f.endswith('.pkl') for f in os.listdir(directory))
+
+
+def read_pickles(source_dir):
+    """Encodings and metadata rows of a legacy directory of {email}_{uuid}.pkl files."""
+    encodings, metadata = [], []
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.endswith('.pkl'):
+            continue
+        try:
+            with open(os.path.join(source_dir, filename), 'rb') as f:
+                data = pickle.load(f)
+            encodings.append(data['encoding'])
+            metadata.append({
+                "name": data['name'],
+                "email": data.get('email', filename.replace('.pkl', '')),
+                "photo_url": data.get('photo_url'),
+            })
+        except Exception as e:
+            print(f"Error loading {filename}: {e}")
+    return encodings, metadata
+
+
+def migrate_pickles(source_dir, store):
+    """One-shot import of a legacy pickle directory into store."""
+    encodings, metadata = read_pickles(source_dir)
+    if encodings:
+        store._write(encodings, metadata)
+    return len(encodings)
+
+
+encoding_store = EncodingStore(legacy_dir=settings.FACE_ENCODINGS_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the binary face encoding store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="import a directory of legacy .pkl encodings")
+    migrate.add_argument("--source", default=None, help="defaults to settings.FACE_ENCODINGS_DIR")
+    migrate.add_argument("--target", default=None, help="defaults to settings.face_store_dir")
+    args = parser.parse_args()
+
+    target = EncodingStore(args.target)
+    if target.exists() and len(target):
+        parser.error(f"{target.directory} already holds encodings; refusing to import twice")
+    imported = migrate_pickles(args.source or settings.FACE_ENCODINGS_DIR, target)
+    print(f"Imported {imported} encodings into {target.directory}")
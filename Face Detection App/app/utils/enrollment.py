@@ -0,0 +1,341 @@
+"""Face enrollment: decode and encode a guest's photos in parallel, then store them in one batch.
+
+Registration hands its photos to enrollment_jobs, which encodes them in the
+background and records per-photo progress in the enrollment_jobs collection.
+
+Also provides a bulk import for onboarding an existing guest database. The
+CSV needs full_name, email and photos (file names separated by ";") columns
+and may have a password column; guests without one get a random password.
+Photos are read from a directory or a .zip archive. Run from the
+"Face Detection App" directory:
+
+    python -m app.utils.enrollment import guests.csv photos.zip
+"""
+import argparse
+import asyncio
+import csv
+import os
+import secrets
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import close_mongo_connection, connect_to_mongo, get_database
+from app.models import User
+from app.utils.encoding_store import encoding_store
+from app.utils.face_utils import encode_image_bytes
+from app.utils.frame_pool import frame_pool
+from app.utils.gallery import gallery
+from app.utils.guest_cache import invalidate_guest
+from app.utils.password_pool import password_pool
+from app.utils.user_cache import invalidate_user
+
+# Upload directory
+UPLOAD_DIR = "uploads"
+Path(UPLOAD_DIR).mkdir(exist_ok=True)
+
+
+def save_upload(filename, data):
+    """Write an uploaded photo under UPLOAD_DIR and return its URL."""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    ext = filename.split(".")[-1]
+    stored_name = f"{timestamp}_{uuid.uuid4().hex[:8]}.{ext}"
+    with open(os.path.join(UPLOAD_DIR, stored_name), "wb") as buffer:
+        buffer.write(data)
+    return f"/{UPLOAD_DIR}/{stored_name}"
+
+
+async def encode_photos(images, detection_method=None):
+    """Encode many in-memory images at once on the worker pool.
+
+    Each result is an encoding, None where no face was found, or the
+    exception a broken image raised.
+    """
+    detection_method = detection_method or settings.detection_method
+    return await asyncio.gather(
+        *(frame_pool.run(encode_image_bytes, data, detection_method) for data in images),
+        return_exceptions=True,
+    )
+
+
+async def enroll_photos(full_name, email, photos):
+    """Save, encode and store one guest's photos given as (filename, bytes) pairs.
+
+    Returns (photo_urls, encodings, encoding_ids). Encodings are written to
+    the encoding store in a single append; nothing is written if no photo
+    has a usable face.
+    """
+    photo_urls = [save_upload(filename, data) for filename, data in photos]
+    results = await encode_photos([data for _, data in photos])
+
+    encodings, metadata = [], []
+    for (filename, _), url, encoding in zip(photos, photo_urls, results):
+        if isinstance(encoding, Exception):
+            print(f"Failed to process photo {filename}: {encoding}")
+            continue
+        if encoding is None:
+            print(f"No face detected in photo: {filename}")
+            continue
+        encodings.append(encoding)
+        metadata.append({"name": full_name, "email": email, "photo_url": url})
+
+    encoding_ids = await run_in_threadpool(encoding_store.append, encodings, metadata) if encodings else []
+    return photo_urls, encodings, encoding_ids
+
+
+def _read_upload(photo_url):
+    with open(photo_url.lstrip("/"), "rb") as f:
+        return f.read()
+
+
+class EnrollmentJobs:
+    """In-process queue that encodes registration photos after the user is created.
+
+    Every job is persisted in the enrollment_jobs collection with one entry
+    per photo (pending, encoded or failed), which the status endpoint reads.
+    Photos are saved before the job is queued, so jobs cut short by a
+    restart are picked up again from disk on the next start().
+    """
+
+    def __init__(self, workers=0):
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        workers = self.workers or settings.enrollment_workers
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(workers)]
+
+        unfinished = get_database()["enrollment_jobs"].find(
+            {"status": {"$in": ["queued", "processing"]}}, {"_id": 1}
+        )
+        resumed = 0
+        async for job in unfinished:
+            self._queue.put_nowait((job["_id"], None))
+            resumed += 1
+        if resumed:
+            print(f"Resumed {resumed} unfinished enrollment jobs")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id, full_name, email, photos):
+        """Save (filename, bytes) photos and queue them; returns (job_id, photo_urls)."""
+        if not self._tasks:
+            await self.start()
+        photo_urls = [save_upload(filename, data) for filename, data in photos]
+        now = datetime.utcnow()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "full_name": full_name,
+            "email": email,
+            "status": "queued",  # queued, processing, completed, failed
+            "photos": [
+                {"filename": filename, "photo_url": url, "status": "pending", "error": None}
+                for (filename, _), url in zip(photos, photo_urls)
+            ],
+            "encoding_ids": [],
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await get_database()["enrollment_jobs"].insert_one(job)
+        self._queue.put_nowait((job["_id"], [data for _, data in photos]))
+        return job["_id"], photo_urls
+
+    async def _work(self):
+        while True:
+            job_id, images = await self._queue.get()
+            try:
+                await self._run(job_id, images)
+            except Exception as e:
+                print(f"Enrollment job {job_id} failed: {e}")
+                try:
+                    await self._update(job_id, status="failed", error=str(e))
+                except Exception as e:
+                    # Keep the worker alive; the job stays unfinished and is resumed on the next start
+                    print(f"Could not mark enrollment job {job_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _update(self, job_id, **fields):
+        fields["updated_at"] = datetime.utcnow()
+        await get_database()["enrollment_jobs"].update_one({"_id": job_id}, {"$set": fields})
+
+    async def _run(self, job_id, images):
+        job = await get_database()["enrollment_jobs"].find_one({"_id": job_id})
+        if job is None:
+            return
+        if job["status"] == "processing":
+            # Cut short by a restart: if the encodings were already stored, only finish up
+            encoding_ids = await run_in_threadpool(encoding_store.rows_where, "job_id", job_id)
+            if encoding_ids:
+                # The gallery read them from the store when it loaded
+                await self._complete(job, encoding_ids)
+                return
+        await self._update(job_id, status="processing")
+        photos = job["photos"]
+        if images is None:
+            images = [None] * len(photos)
+
+        async def encode(i, data):
+            try:
+                if data is None:
+                    data = await run_in_threadpool(_read_upload, photos[i]["photo_url"])
+                encoding = await frame_pool.run(encode_image_bytes, data, settings.detection_method)
+                error = None if encoding is not None else "No face detected"
+            except Exception as e:
+                encoding, error = None, str(e)
+            await self._update(
+                job_id,
+                **{f"photos.{i}.status": "failed" if error else "encoded", f"photos.{i}.error": error},
+            )
+            return encoding
+
+        results = await asyncio.gather(*(encode(i, data) for i, data in enumerate(images)))
+
+        encodings, metadata = [], []
+        for photo, encoding in zip(photos, results):
+            if encoding is not None:
+                encodings.append(encoding)
+                metadata.append({
+                    "name": job["full_name"],
+                    "email": job["email"],
+                    "photo_url": photo["photo_url"],
+                    "job_id": job_id,  # lets a resumed job find rows it already stored
+                })
+
+        if not encodings:
+            await self._update(
+                job_id,
+                status="failed",
+                error="No faces detected in the provided photos. Please upload clear photos with visible faces.",
+            )
+            # As when registration rejected these photos outright: no account, so the guest can sign up again
+            await get_database()["users"].delete_one(
+                {"_id": ObjectId(job["user_id"]), "encoding_ids": {"$in": [None, []]}}
+            )
+            invalidate_user(job["email"])
+            return
+
+        # All of this guest's encodings in one append to the binary store
+        encoding_ids = await run_in_threadpool(encoding_store.append, encodings, metadata)
+
+        # Make the new guest recognizable by already-connected cameras
+        names, emails = [job["full_name"]] * len(encodings), [job["email"]] * len(encodings)
+        gallery.add(encodings, names, emails, encoding_ids)
+        await self._complete(job, encoding_ids)
+
+    async def _complete(self, job, encoding_ids):
+        await get_database()["users"].update_one(
+            {"_id": ObjectId(job["user_id"])}, {"$set": {"encoding_ids": encoding_ids}}
+        )
+        invalidate_user(job["email"])
+        invalidate_guest(job["email"])
+        await self._update(job["_id"], status="completed", encoding_ids=encoding_ids)
+
+
+enrollment_jobs = EnrollmentJobs()
+
+
+class PhotoSource:
+    """Reads photos by relative name from a directory or a .zip archive."""
+
+    def __init__(self, path):
+        self.path = path
+        self._archive = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+
+    def read(self, name):
+        if self._archive is not None:
+            return self._archive.read(name)
+        with open(os.path.join(self.path, name), "rb") as f:
+            return f.read()
+
+
+async def bulk_import(csv_path, photos_path, batch_size=100):
+    """Create users and encodings for every guest in the CSV; returns (imported, skipped)."""
+    await connect_to_mongo()
+    db = get_database()
+    source = PhotoSource(photos_path)
+    imported = skipped = 0
+    seen = set()  # emails already handled in this import, in any batch
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    try:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            existing = {
+                user["email"]
+                async for user in db["users"].find(
+                    {"email": {"$in": [row["email"] for row in batch]}}, {"email": 1}
+                )
+            }
+            for row in batch:
+                if row["email"] in seen:
+                    print(f"Skipping {row['email']}: repeated in {csv_path}")
+                    skipped += 1
+                    continue
+                seen.add(row["email"])
+                if row["email"] in existing:
+                    print(f"Skipping {row['email']}: already registered")
+                    skipped += 1
+                    continue
+
+                photos = []
+                for name in filter(None, (p.strip() for p in row["photos"].split(";"))):
+                    try:
+                        photos.append((name, source.read(name)))
+                    except (KeyError, OSError) as e:
+                        print(f"Missing photo {name} for {row['email']}: {e}")
+
+                photo_urls, encodings, encoding_ids = await enroll_photos(row["full_name"], row["email"], photos)
+                if not encodings:
+                    print(f"Skipping {row['email']}: no faces detected")
+                    skipped += 1
+                    continue
+
+                password = row.get("password") or secrets.token_urlsafe(12)
+                user = User(
+                    full_name=row["full_name"],
+                    email=row["email"],
+                    hashed_password=await password_pool.hash(password),
+                    role="user",
+                )
+                document = user.dict(by_alias=True, exclude={"id"})
+                document.update(photo_urls=photo_urls, encoding_ids=encoding_ids)
+                await db["users"].insert_one(document)
+                imported += 1
+            print(f"Processed {min(start + batch_size, len(rows))}/{len(rows)} guests")
+    finally:
+        frame_pool.shutdown()
+        password_pool.shutdown()
+        await close_mongo_connection()
+    return imported, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face enrollment tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="bulk import guests from a CSV and a photo directory or archive")
+    importer.add_argument("csv", help="CSV with full_name, email, photos and optional password columns")
+    importer.add_argument("photos", help="directory or .zip archive holding the photos")
+    importer.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    imported, skipped = asyncio.run(bulk_import(args.csv, args.photos, args.batch_size))
+    print(f"Imported {imported} guests, skipped {skipped}")
+    print("Running servers pick them up after POST /api/admin/gallery/reload")
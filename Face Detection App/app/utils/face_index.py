@@ -0,0 +1,251 @@
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.utils.gallery import gallery
+from app.utils.matcher import pairwise_distances, squared_norms, top_k
+
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:  # scikit-learn is optional
+    BallTree = None
+
+
+def _pad(idx, dists, k):
+    """Pad search results to k columns with row -1 / distance inf."""
+    missing = k - idx.shape[1]
+    if missing <= 0:
+        return idx, dists
+    idx = np.pad(idx, ((0, 0), (0, missing)), constant_values=-1)
+    dists = np.pad(dists, ((0, 0), (0, missing)), constant_values=np.inf)
+    return idx, dists
+
+
+class BruteForceIndex:
+    """Exact search: scores every gallery row."""
+
+    kind = "brute"
+
+    def __init__(self, source=None):
+        self.source = gallery if source is None else source
+
+    def search(self, queries, k=1, known=None):
+        """Return (rows, distances), each (queries x k), nearest first.
+
+        Pass known to search a snapshot already taken, e.g. the one the
+        caller looks the rows up in; otherwise a fresh one is used.
+        """
+        known = self.source.snapshot() if known is None else known
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, known.encodings.shape[1])
+        if not len(known.encodings):
+            return _pad(np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0)), k)
+        dists = pairwise_distances(queries, known.encodings, known.sq_norms)
+        return _pad(*top_k(dists, k), k)
+
+
+def kmeans(data, clusters, iterations=10, seed=0):
+    """Plain Lloyd's k-means on float32 rows; returns (centroids, labels)."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmin(pairwise_distances(data, centroids), axis=1)
+        counts = np.bincount(labels, minlength=clusters)
+        filled = np.flatnonzero(counts)
+        starts = (np.cumsum(counts) - counts)[filled]
+        sums = np.add.reduceat(data[np.argsort(labels, kind="stable")], starts, axis=0)
+        centroids[filled] = sums / counts[filled, None]
+    labels = np.argmin(pairwise_distances(data, centroids), axis=1)
+    return centroids, labels
+
+
+class IVFIndex:
+    """Inverted-file index: k-means partitions the gallery, queries scan only the nprobe nearest cells.
+
+    nprobe is the recall/latency knob: nprobe == nlist is exact, smaller values
+    scan roughly nprobe/nlist of the gallery. New rows are assigned to their
+    nearest cell as they are enrolled. The partition is trained on a
+    background thread after a reload and once the gallery has doubled since
+    the last training, and swapped in when done; searches use the exact scan
+    until the first one is ready.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, source=None, nlist=0, nprobe=8, min_train_size=1024):
+        self.source = gallery if source is None else source
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.centroids = None
+        self._centroid_sq_norms = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._size = 0  # gallery rows covered by _assign
+        self._version = -1  # gallery version _assign reflects
+        self._trained_size = 0
+        self._lists = None
+        self._lock = threading.Lock()  # guards the partition against the enrollment path
+        self._trainer = None
+        self.source.subscribe(self._on_change)
+
+    def search(self, queries, k=1, known=None):
+        known = self.source.snapshot() if known is None else known
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, known.encodings.shape[1])
+        size = len(known.encodings)
+        if size < self.min_train_size:
+            # Partitioning does not pay off on small galleries
+            return BruteForceIndex(self.source).search(queries, k, known)
+        with self._lock:
+            centroids = self.centroids
+            stale = centroids is None or size > 2 * self._trained_size
+            if centroids is not None:
+                order, offsets = self._inverted_lists()
+        if stale:
+            self.train_in_background()
+        if centroids is None:
+            return BruteForceIndex(self.source).search(queries, k, known)
+
+        nprobe = min(self.nprobe, len(centroids))
+        cells, _ = top_k(pairwise_distances(queries, centroids), nprobe)
+
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        dists = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for i, query_cells in enumerate(cells):
+            candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in query_cells])
+            # The partition may already cover rows newer than the snapshot
+            candidates = candidates[candidates < size]
+            if not len(candidates):
+                continue
+            cand_dists = pairwise_distances(
+                queries[i], known.encodings[candidates], known.sq_norms[candidates]
+            )
+            idx, best = top_k(cand_dists, k)
+            rows[i, :idx.shape[1]] = candidates[idx[0]]
+            dists[i, :idx.shape[1]] = best[0]
+        return rows, dists
+
+    def train_in_background(self):
+        """Start train() on a thread unless one is already running."""
+        with self._lock:
+            if self._trainer is not None and self._trainer.is_alive():
+                return
+            self._trainer = threading.Thread(target=self._train_logged, name="ivf-train", daemon=True)
+            self._trainer.start()
+
+    def _train_logged(self):
+        try:
+            self.train()
+        except Exception as e:
+            print(f"IVF training failed: {e}")
+
+    def train(self):
+        """Recompute the partition from the current gallery and swap it in."""
+        known = self.source.snapshot()
+        size = len(known.encodings)
+        if not size:
+            return
+        nlist = self.nlist or max(1, int(np.sqrt(size)))
+        nlist = min(nlist, size)
+        # Train on a sample; assignment of the remaining rows is a single pass
+        rng = np.random.default_rng(0)
+        sample = known.encodings[rng.choice(size, min(size, 64 * nlist), replace=False)]
+        centroids, _ = kmeans(sample, nlist)
+        centroid_sq_norms = squared_norms(centroids)
+
+        with self._lock:
+            # Assign against the gallery as it is now, so changes made while training are not lost
+            current = self.source.snapshot()
+            size = len(current.encodings)
+            assign = np.empty(max(size, 1024), dtype=np.int32)
+            assign[:size] = np.argmin(pairwise_distances(current.encodings, centroids, centroid_sq_norms), axis=1)
+            self.centroids, self._centroid_sq_norms = centroids, centroid_sq_norms
+            self._assign, self._size, self._version = assign, size, current.version
+            self._trained_size = size
+            self._lists = None
+
+    def _nearest_cell(self, encodings):
+        return np.argmin(pairwise_distances(encodings, self.centroids, self._centroid_sq_norms), axis=1)
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            assign = self._assign[:self._size]
+            order = np.argsort(assign, kind="stable")
+            offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assign, minlength=len(self.centroids)), out=offsets[1:])
+            self._lists = (order, offsets)
+        return self._lists
+
+    def _on_change(self, change):
+        if change.kind == "reload":
+            with self._lock:
+                self.centroids = None
+                self._lists = None
+            if len(self.source) >= self.min_train_size:
+                self.train_in_background()
+            return
+
+        with self._lock:
+            # Before the first training, or already part of a newer one
+            if self.centroids is None or change.version <= self._version:
+                return
+            if change.kind == "add":
+                known = self.source.snapshot()
+                if change.rows.stop > len(self._assign):
+                    grown = np.empty(max(change.rows.stop, 2 * len(self._assign)), dtype=np.int32)
+                    grown[:self._size] = self._assign[:self._size]
+                    self._assign = grown
+                rows = slice(change.rows.start, change.rows.stop)
+                self._assign[rows] = self._nearest_cell(known.encodings[rows])
+                self._size = change.rows.stop
+            elif change.kind == "remove":
+                for src, dst in change.moves:
+                    self._assign[dst] = self._assign[src]
+                self._size -= len(change.rows)
+            self._version = change.version
+            self._lists = None
+
+
+class BallTreeIndex:
+    """Exact tree search via scikit-learn's BallTree, rebuilt lazily after gallery changes.
+
+    Trees lose most of their pruning power at 128 dimensions, so this mainly
+    helps small, rarely changing galleries.
+    """
+
+    kind = "balltree"
+
+    def __init__(self, source=None, leaf_size=40):
+        if BallTree is None:
+            raise RuntimeError("scikit-learn is required for the balltree face index")
+        self.source = gallery if source is None else source
+        self.leaf_size = leaf_size
+        self._tree = None
+        self._version = None
+
+    def search(self, queries, k=1, known=None):
+        known = self.source.snapshot() if known is None else known
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, known.encodings.shape[1])
+        if not len(known.encodings):
+            return BruteForceIndex(self.source).search(queries, k, known)
+        if self._version != known.version:
+            self._tree = BallTree(known.encodings, leaf_size=self.leaf_size)
+            self._version = known.version
+        dists, rows = self._tree.query(queries, k=min(k, len(known.encodings)))
+        return _pad(rows.astype(np.int64), dists.astype(np.float32), k)
+
+
+INDEX_TYPES = {
+    BruteForceIndex.kind: BruteForceIndex,
+    IVFIndex.kind: IVFIndex,
+    BallTreeIndex.kind: BallTreeIndex,
+}
+
+
+def create_index(kind, source=None):
+    """Build the configured face index over the gallery (or any object with snapshot())."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown face index '{kind}', expected one of {sorted(INDEX_TYPES)}")
+    if kind == IVFIndex.kind:
+        return IVFIndex(source, nlist=settings.ivf_nlist, nprobe=settings.ivf_nprobe)
+    return INDEX_TYPES[kind](source)
+
@@ -1,22 +1,27 @@
 import os
+import time
 import cv2
+import dlib
 import face_recognition
 import numpy as np
+from face_recognition.api import face_encoder, pose_predictor_5_point, pose_predictor_68_point
 from app.config import settings
+from app.utils.matcher import match_encodings
 import os
 import pickle
 from pathlib import Path
 
-def load_known_faces():
+def load_known_faces(encodings_dir=None):
     """Load known face encodings from .pkl files in the encodings directory."""
+    encodings_dir = encodings_dir or settings.FACE_ENCODINGS_DIR
     known_encs = []
     known_names = []
     known_emails = []
 
-    for filename in os.listdir(settings.FACE_ENCODINGS_DIR):
+    for filename in os.listdir(encodings_dir):
         if filename.endswith('.pkl'):
             try:
-                with open(os.path.join(settings.FACE_ENCODINGS_DIR, filename), 'rb') as f:
+                with open(os.path.join(encodings_dir, filename), 'rb') as f:
                     data = pickle.load(f)
                     known_encs.append(data['encoding'])
                     known_names.append(data['name'])
@@ -34,44 +39,207 @@ def eye_aspect_ratio(eye):
     return (A + B) / (2.0 * C)
 
 
-def process_frame(frame, known_encodings, known_names, known_emails, frame_scale, detection_method, recognition_threshold):
-    """Detect faces, recognize them and compute EAR (eye aspect ratio)."""
-    small = cv2.resize(frame, (0, 0), fx=frame_scale, fy=frame_scale)
-    rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+def eye_aspect_ratios(eyes):
+    """Vectorised EAR for any number of eyes at once; eyes is (..., 6, 2)."""
+    eyes = np.asarray(eyes, dtype=np.float32)
+    A = np.linalg.norm(eyes[..., 1, :] - eyes[..., 5, :], axis=-1)
+    B = np.linalg.norm(eyes[..., 2, :] - eyes[..., 4, :], axis=-1)
+    C = np.linalg.norm(eyes[..., 0, :] - eyes[..., 3, :], axis=-1)
+    return (A + B) / (2.0 * C)
+
+
+def eye_box(eyes, scale=1.0):
+    """Full-frame (top, right, bottom, left) box around a face's (2, 6, 2) eye points."""
+    points = np.asarray(eyes).reshape(-1, 2)
+    l, t = points.min(axis=0)
+    r, b = points.max(axis=0)
+    return tuple(int(v / scale) for v in (t, r, b, l))
+
+
+def eye_landmarks(frame, locations, margin=0.2):
+    """Eye points for already-located faces, without the full-frame landmark pass.
+
+    Runs the 68-point predictor on a small grayscale crop around each
+    full-frame box and keeps only points 36-47. Returns a (faces, 2, 6, 2)
+    array of full-frame (x, y) points, left eye first.
+    """
+    height, width = frame.shape[:2]
+    eyes = np.empty((len(locations), 2, 6, 2), dtype=np.float32)
+    for i, (t, r, b, l) in enumerate(locations):
+        pad = int((b - t) * margin)
+        top, bottom = max(0, t - pad), min(height, b + pad)
+        left, right = max(0, l - pad), min(width, r + pad)
+        crop = cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_BGR2GRAY)
+        shape = pose_predictor_68_point(crop, dlib.rectangle(l - left, t - top, r - left, b - top))
+        points = [(shape.part(j).x + left, shape.part(j).y + top) for j in range(36, 48)]
+        eyes[i] = np.reshape(points, (2, 6, 2))
+    return eyes
+
+
+# Largest JPEG reductions first; libjpeg decodes these straight from the DCT coefficients
+_REDUCED_DECODES = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+# Face height in pixels at which the 68-point predictor still places the eye points reliably
+LANDMARK_FACE_PIXELS = 100
+# Per-process scratch images reused across frames, keyed by (purpose, shape)
+_buffers = {}
+
+
+def _buffer(purpose, shape):
+    buf = _buffers.get((purpose, shape))
+    if buf is None:
+        if len(_buffers) >= 8:
+            _buffers.clear()  # cameras changed resolution; drop the stale sizes
+        buf = _buffers[(purpose, shape)] = np.empty(shape, dtype=np.uint8)
+    return buf
+
+
+def _lap(timings, stage, started):
+    """Add the time since started to timings[stage] (if collecting) and return now."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - started
+    return now
+
+
+def landmark_scale(known_locations):
+    """Smallest scale that keeps every tracked face LANDMARK_FACE_PIXELS tall (at most 1)."""
+    smallest = min((b - t for t, r, b, l in known_locations), default=0)
+    return 1.0 if smallest <= LANDMARK_FACE_PIXELS else LANDMARK_FACE_PIXELS / smallest
+
+
+def analysis_scale(frame_scale, known_locations=None):
+    """Scale a frame must at least be decoded or resized to for analyze_frame."""
+    return frame_scale if known_locations is None else landmark_scale(known_locations)
+
+
+def decode_for_scale(data, frame_scale):
+    """Decode an encoded image at the smallest 1/2, 1/4 or 1/8 size still at least frame_scale.
+
+    Returns (frame, decoded_scale), or (None, 1.0) if it cannot be decoded.
+    """
+    buf = np.frombuffer(data, np.uint8)
+    for factor, flag in _REDUCED_DECODES:
+        if frame_scale * factor <= 1.0:
+            return cv2.imdecode(buf, flag), 1.0 / factor
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR), 1.0
+
+
+def analyze_frame(frame, frame_scale, detection_method, known_locations=None, decoded_scale=1.0, timings=None):
+    """Detect faces, encode them and compute EAR; the CPU-heavy half of process_frame.
+
+    Needs no gallery, so it can run in a worker process. Returns
+    (locations, encodings, ears, eye_boxes) with boxes scaled back to the
+    full frame. frame may already be decoded at decoded_scale of the full
+    frame, in which case it is only resized by what is left. Given
+    known_locations (full-frame boxes, e.g. from a tracker) it takes the
+    liveness fast path instead: no resize, detection, encoding or full
+    landmark set, just eye landmarks on a crop per face of the frame as
+    decoded; encodings is None.
+    Pass a dict as timings to have the seconds spent per stage added to it.
+    """
+    started = time.perf_counter()
+    if known_locations is not None:
+        boxes = [tuple(int(v * decoded_scale) for v in box) for box in known_locations]
+        eyes = eye_landmarks(frame, boxes)
+        ears = eye_aspect_ratios(eyes).mean(axis=1).tolist()
+        _lap(timings, "landmark", started)
+        return list(known_locations), None, ears, [eye_box(e, decoded_scale) for e in eyes]
+
+    resize = frame_scale / decoded_scale
+    small = frame
+    if abs(resize - 1.0) > 1e-3:
+        height, width = frame.shape[:2]
+        size = (max(1, round(width * resize)), max(1, round(height * resize)))
+        small = cv2.resize(frame, size, dst=_buffer("small", (size[1], size[0], 3)))
+    rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=_buffer("rgb", small.shape))
+    started = _lap(timings, "resize", started)
 
     locs_small = face_recognition.face_locations(rgb_small, model=detection_method)
-    encs = face_recognition.face_encodings(rgb_small, known_face_locations=locs_small)
-    landmarks_small = face_recognition.face_landmarks(rgb_small, locs_small)
+    started = _lap(timings, "detect", started)
+    # One dlib rectangle per face, shared by the encoder's 5-point and the eyes' 68-point landmarks
+    rects = [dlib.rectangle(l, t, r, b) for t, r, b, l in locs_small]
+    encs = [
+        np.array(face_encoder.compute_face_descriptor(rgb_small, pose_predictor_5_point(rgb_small, rect), 1))
+        for rect in rects
+    ]
+    started = _lap(timings, "encode", started)
 
-    locs, names, emails, ears = [], [], [], []
+    locs, ears, marks = [], [], []
 
-    for i, (box, enc) in enumerate(zip(locs_small, encs)):
+    for box, rect in zip(locs_small, rects):
         t, r, b, l = [int(v / frame_scale) for v in box]
         locs.append((t, r, b, l))
 
-        # Default
-        name = "Unknown"
-        email = None
-
-        if known_encodings:
-            dists = face_recognition.face_distance(known_encodings, enc)
-            idx = np.argmin(dists)
-            if dists[idx] < recognition_threshold:
-                name = known_names[idx]
-                email = known_emails[idx]
-
-        names.append(name)
-        emails.append(email)
-
-        # EAR calculation
-        ear = None
-        if i < len(landmarks_small):
-            lm = landmarks_small[i]
-            if 'left_eye' in lm and 'right_eye' in lm:
-                ear_left = eye_aspect_ratio(lm['left_eye'])
-                ear_right = eye_aspect_ratio(lm['right_eye'])
-                ear = (ear_left + ear_right) / 2.0
-        ears.append(ear)
+        # EAR calculation, both eyes in one op
+        shape = pose_predictor_68_point(rgb_small, rect)
+        eyes = np.array([(shape.part(j).x, shape.part(j).y) for j in range(36, 48)], dtype=np.float32)
+        eyes = eyes.reshape(2, 6, 2)
+        ears.append(float(eye_aspect_ratios(eyes).mean()))
+        marks.append(eye_box(eyes, frame_scale))
+    _lap(timings, "landmark", started)
+
+    return locs, encs, ears, marks
+
+
+def analyze_jpeg(data, frame_scale, detection_method, known_locations=None, timings=None):
+    """Decode an encoded image and run analyze_frame on it; None if it cannot be decoded.
+
+    Detection frames are decoded at a reduced size matching frame_scale;
+    eye fast path frames at one that keeps the tracked faces tall enough
+    for landmarks. The full frame's (height, width) is appended to the
+    analyze_frame result so the caller can fit the scale of the next
+    frames to the camera.
+    """
+    started = time.perf_counter()
+    frame, decoded_scale = decode_for_scale(data, analysis_scale(frame_scale, known_locations))
+    if frame is None:
+        return None
+    _lap(timings, "decode", started)
+    size = tuple(round(v / decoded_scale) for v in frame.shape[:2])
+    return (*analyze_frame(frame, frame_scale, detection_method, known_locations, decoded_scale, timings), size)
+
+
+def analyze_image(frame, frame_scale, detection_method, known_locations=None, timings=None, decoded_scale=1.0):
+    """analyze_jpeg for an already decoded BGR frame, e.g. from cv2.VideoCapture.
+
+    The frame may have been shrunk to decoded_scale first (see downscale) so
+    less of it is pickled to the worker; results are still full-frame.
+    """
+    size = tuple(round(v / decoded_scale) for v in frame.shape[:2])
+    return (*analyze_frame(frame, frame_scale, detection_method, known_locations, decoded_scale, timings), size)
+
+
+def downscale(frame, scale):
+    """Shrink a decoded frame to scale (when below 1); returns (frame, scale applied)."""
+    if scale >= 1.0:
+        return frame, 1.0
+    height, width = frame.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA), scale
+
+
+def run_timed(analyze, *args):
+    """Call analyze_jpeg or analyze_image collecting stage timings; returns (result, timings).
+
+    For the worker pool, where a timings dict passed in would not come back.
+    """
+    timings = {}
+    return analyze(*args, timings=timings), timings
+
+
+def process_frame(frame, known_encodings, known_names, known_emails, frame_scale, detection_method, recognition_threshold,
+                  known_sq_norms=None, index=None):
+    """Detect faces, recognize them and compute EAR (eye aspect ratio)."""
+    locs, encs, ears, _ = analyze_frame(frame, frame_scale, detection_method)
+
+    # One (faces x gallery) distance matrix for the whole frame
+    names, emails, _ = match_encodings(
+        encs, known_encodings, known_names, known_emails, recognition_threshold, known_sq_norms, index
+    )
 
     return locs, names, ears, emails
 
@@ -89,4 +257,15 @@ def encode_face(image, detection_method="hog"):
     if not encodings:
         return None
         
-    return encodings[0]
\ No newline at end of file
+    return encodings[0]
+
+
+def encode_image_bytes(data, detection_method="hog"):
+    """Decode an uploaded image straight from memory and encode its first face.
+
+    Returns None if the image cannot be decoded or has no face.
+    """
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return encode_face(image, detection_method)
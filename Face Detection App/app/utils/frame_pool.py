@@ -0,0 +1,79 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.config import settings
+
+
+def _warm_up():
+    # Load the dlib models once per worker instead of on its first frame
+    import app.utils.face_utils  # noqa: F401
+
+
+class FramePool:
+    """Process pool for CPU-bound frame analysis, kept off the asyncio event loop.
+
+    At most max_pending jobs are queued or running at once; further callers
+    wait in run(), which stops them reading from their socket and pushes the
+    backpressure back to the camera. A caller that awaits each frame before
+    sending the next keeps its frames in order.
+
+    If a worker dies (e.g. dlib crashing on a frame), the executor is broken
+    for good; run() then replaces it and retries the job once.
+    """
+
+    def __init__(self, workers=0, max_pending=0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = None
+        self._workers = 0
+
+    def start(self):
+        if self._executor is not None:
+            return
+        workers = self._workers = self.workers or settings.frame_workers or os.cpu_count() or 1
+        max_pending = self.max_pending or settings.frame_queue_size or 2 * workers
+        self._executor = self._create_executor()
+        self._slots = asyncio.Semaphore(max_pending)
+        print(f"Started frame pool with {workers} workers, {max_pending} pending frames max")
+
+    def _create_executor(self):
+        # spawn: forking a process that already runs an event loop and Mongo client is unsafe
+        return ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up,
+        )
+
+    def _replace_broken(self, broken):
+        # Jobs failing together all see the same broken executor; only the first replaces it
+        if self._executor is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._create_executor()
+            print("Frame pool worker died, restarted the pool")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in a worker process once a slot is free."""
+        if self._executor is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            for attempt in range(2):
+                executor = self._executor
+                try:
+                    return await loop.run_in_executor(executor, fn, *args)
+                except BrokenProcessPool:
+                    self._replace_broken(executor)
+                    if attempt:
+                        raise  # the job killed its worker again
+
+
+frame_pool = FramePool()
@@ -0,0 +1,36 @@
+import asyncio
+
+
+class LatestFrameSlot:
+    """Single-frame mailbox where a newer frame replaces one not yet picked up.
+
+    The producer never waits, and the consumer always gets the newest frame
+    together with how many older ones were dropped since its last get(), so
+    latency stays bounded however fast the camera sends.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._skipped = 0
+        self._closed = False
+        self._ready = asyncio.Event()
+
+    def put(self, frame):
+        if self._frame is not None:
+            self._skipped += 1
+        self._frame = frame
+        self._ready.set()
+
+    def close(self):
+        """Wake the consumer; get() returns (None, skipped) once the slot is drained."""
+        self._closed = True
+        self._ready.set()
+
+    async def get(self):
+        """Wait for a frame and return (frame, skipped), or (None, skipped) after close()."""
+        while self._frame is None and not self._closed:
+            self._ready.clear()
+            await self._ready.wait()
+        frame, skipped = self._frame, self._skipped
+        self._frame, self._skipped = None, 0
+        return frame, skipped
@@ -0,0 +1,280 @@
+import sys
+import threading
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from app.config import settings
+from app.utils.encoding_store import encoding_store
+from app.utils.face_utils import load_known_faces
+from app.utils.matcher import ENCODING_DIM, squared_norms
+
+GallerySnapshot = namedtuple("GallerySnapshot", ["encodings", "sq_norms", "names", "emails", "version"])
+
+# kind is "reload", "add" or "remove". For "add", rows is the range of appended
+# rows. For "remove", rows lists the removed positions and moves the
+# (src, dst) row copies applied, in order, to keep the matrix dense.
+# emails holds the guests whose rows changed (None for "reload").
+GalleryChange = namedtuple("GalleryChange", ["kind", "rows", "moves", "version", "emails"])
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+class FaceGallery:
+    """Process-wide set of known face encodings shared by every websocket session.
+
+    Encodings are held as one contiguous float32 (N x 128) matrix with parallel
+    squared-norm, name and email arrays. Rows are appended in place in O(k)
+    and removed in place in O(k) as well, unless a snapshot handed out
+    earlier is still held, in which case the arrays are copied first. Every
+    change is published to subscribers.
+
+    Snapshots are read-only views that never change underneath their holder:
+    appends only write past their end and removals leave held arrays alone.
+    Still take a fresh one per frame to see newly enrolled guests.
+    """
+
+    def __init__(self, encodings_dir=None, capacity=1024, store=None):
+        self.encodings_dir = encodings_dir
+        self.store = store
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._idle_marker = object()  # reference-count baseline for _in_use()
+        self._version = 0
+        self._set_buffers(*self._allocate(capacity), size=0)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def version(self):
+        return self._version
+
+    def snapshot(self):
+        """Return the current read-only (encodings, sq_norms, names, emails, version) view."""
+        return self._snapshot
+
+    def subscribe(self, listener):
+        """Call listener(GalleryChange) after every change to the gallery."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def load(self):
+        """(Re)read every stored encoding from disk and swap it in atomically.
+
+        Reads the binary encoding store, which first adopts the legacy
+        directory of one pickle per photo if it was never written. Without a
+        store the pickles are read directly.
+        """
+        if self.store is not None:
+            self.store.adopt_legacy()
+        if self.store is not None and self.store.exists():
+            ids, encs, names, emails = self.store.load()
+            return self.replace(encs, names, emails, ids)
+        encodings_dir = self.encodings_dir or settings.FACE_ENCODINGS_DIR
+        encs, names, emails = load_known_faces(encodings_dir)
+        return self.replace(encs, names, emails)
+
+    def replace(self, encodings, names, emails, ids=None):
+        """Swap in a whole new set of rows and return its size.
+
+        A dense float32 matrix (e.g. the store's read-only memmap) is used
+        as-is rather than copied; it is copied on the first in-place removal.
+        """
+        count = len(encodings)
+        buffers = list(self._allocate(max(count, 1024)))
+        if isinstance(encodings, np.ndarray) and encodings.dtype == np.float32 and encodings.ndim == 2 \
+                and encodings.flags.c_contiguous:
+            buffers[0] = encodings
+        else:
+            for row, enc in enumerate(encodings):
+                buffers[0][row] = enc
+        buffers[1][:count] = squared_norms(buffers[0][:count])
+        buffers[2][:count] = names
+        buffers[3][:count] = emails
+        buffers[4][:count] = np.arange(count) if ids is None else ids
+
+        with self._lock:
+            self._set_buffers(*buffers, size=count)
+            change = self._commit("reload", range(count))
+        self._publish(change)
+        return count
+
+    def reload(self):
+        """Explicitly refresh the gallery, e.g. after encodings were edited on disk."""
+        return self.load()
+
+    def add(self, encodings, names, emails, ids=None):
+        """Append rows for newly enrolled faces and return their ids.
+
+        Pass ids when the rows were already persisted (e.g. encoding store
+        row numbers); otherwise fresh ids are assigned.
+        """
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        count = len(encodings)
+        if not count:
+            return []
+
+        with self._lock:
+            start = self._size
+            stop = start + count
+            self._reserve(stop)
+
+            if ids is None:
+                ids = range(self._next_id, self._next_id + count)
+            ids = [int(face_id) for face_id in ids]
+            self._next_id = max(self._next_id, max(ids) + 1)
+            self._encodings[start:stop] = encodings
+            self._sq_norms[start:stop] = squared_norms(encodings)
+            self._names[start:stop] = names
+            self._emails[start:stop] = emails
+            self._ids[start:stop] = ids
+            for row, (face_id, email) in enumerate(zip(ids, emails), start):
+                self._row_of[face_id] = row
+                self._ids_by_email[email].add(face_id)
+
+            self._size = stop
+            change = self._commit("add", range(start, stop), emails=set(emails))
+        self._publish(change)
+        return ids
+
+    def remove(self, ids):
+        """Drop rows by id, filling each hole with the last row. Returns the count removed."""
+        with self._lock:
+            rows = sorted((self._row_of[i] for i in ids if i in self._row_of), reverse=True)
+            if not rows:
+                return 0
+
+            if self._in_use():
+                # Copy on write: snapshots still held keep the old arrays
+                buffers = self._allocate(len(self._names))
+                for new, old in zip(buffers, self._buffers()):
+                    new[:self._size] = old[:self._size]
+            else:
+                buffers = self._buffers()
+            encodings, sq_norms, names, emails, face_ids = buffers
+            size = self._size
+
+            moves = []
+            removed_emails = set()
+            for row in rows:
+                face_id = int(face_ids[row])
+                removed_emails.add(emails[row])
+                del self._row_of[face_id]
+                self._ids_by_email[emails[row]].discard(face_id)
+
+                last = size - 1
+                if row != last:
+                    encodings[row] = encodings[last]
+                    sq_norms[row] = sq_norms[last]
+                    names[row] = names[last]
+                    emails[row] = emails[last]
+                    face_ids[row] = face_ids[last]
+                    self._row_of[int(face_ids[row])] = row
+                    moves.append((last, row))
+                names[last] = None
+                emails[last] = None
+                size = last
+
+            self._encodings, self._sq_norms, self._names, self._emails, self._ids = buffers
+            self._size = size
+            change = self._commit("remove", rows, moves, removed_emails)
+        self._publish(change)
+        return len(rows)
+
+    def remove_email(self, email):
+        """Drop every encoding enrolled for a guest, e.g. before re-enrollment.
+
+        Also tombstones the rows in the backing encoding store, if any.
+        """
+        ids = sorted(self._ids_by_email.get(email, ()))
+        if self.store is not None and ids:
+            self.store.tombstone(ids)
+        return self.remove(ids)
+
+    def ids_for_email(self, email):
+        return sorted(self._ids_by_email.get(email, ()))
+
+    def rows_for_email(self, email):
+        """Current row positions of a guest's encodings in the snapshot."""
+        return sorted(self._row_of[i] for i in self._ids_by_email.get(email, ()))
+
+    def _allocate(self, capacity):
+        return (
+            np.empty((capacity, ENCODING_DIM), dtype=np.float32),
+            np.empty(capacity, dtype=np.float32),
+            np.empty(capacity, dtype=object),
+            np.empty(capacity, dtype=object),
+            np.empty(capacity, dtype=np.int64),
+        )
+
+    def _buffers(self):
+        return self._encodings, self._sq_norms, self._names, self._emails, self._ids
+
+    def _set_buffers(self, encodings, sq_norms, names, emails, ids, size):
+        self._encodings, self._sq_norms, self._names, self._emails, self._ids = (
+            encodings, sq_norms, names, emails, ids
+        )
+        self._size = size
+        self._next_id = int(ids[:size].max()) + 1 if size else 0
+        self._row_of = {int(face_id): row for row, face_id in enumerate(ids[:size])}
+        self._ids_by_email = defaultdict(set)
+        for face_id, email in zip(ids[:size], emails[:size]):
+            self._ids_by_email[email].add(int(face_id))
+        self._snapshot = self._make_snapshot()
+
+    def _in_use(self):
+        """Whether a snapshot handed out earlier (or a view of its arrays) is still held.
+
+        Arrays that do not own their memory, like the store's memmap, always
+        count as in use.
+        """
+        if not all(buffer.flags.owndata for buffer in self._buffers()):
+            return True
+        # Counted alike, the current snapshot and its four views have a single owner, like the
+        # marker, unless someone else holds them; the arrays behind the views have one more
+        held = (self._idle_marker, self._snapshot, *self._snapshot[:4], *self._buffers()[:4])
+        idle, *counts = [sys.getrefcount(obj) for obj in held]
+        limits = [idle] * 5 + [idle + 1] * 4
+        return any(count > limit for count, limit in zip(counts, limits))
+
+    def _reserve(self, needed):
+        capacity = len(self._encodings)
+        if needed <= capacity:
+            return
+        # Grow geometrically so appends stay amortised O(k)
+        grown = self._allocate(max(needed, capacity * 2))
+        for new, old in zip(grown, self._buffers()):
+            new[:self._size] = old[:self._size]
+        self._encodings, self._sq_norms, self._names, self._emails, self._ids = grown
+
+    def _make_snapshot(self):
+        size = self._size
+        return GallerySnapshot(
+            encodings=_read_only(self._encodings[:size]),
+            sq_norms=_read_only(self._sq_norms[:size]),
+            names=_read_only(self._names[:size]),
+            emails=_read_only(self._emails[:size]),
+            version=self._version,
+        )
+
+    def _commit(self, kind, rows, moves=(), emails=None):
+        self._version += 1
+        self._snapshot = self._make_snapshot()
+        return GalleryChange(kind=kind, rows=rows, moves=list(moves), version=self._version, emails=emails)
+
+    def _publish(self, change):
+        for listener in list(self._listeners):
+            try:
+                listener(change)
+            except Exception as e:
+                print(f"Gallery listener failed on {change.kind}: {e}")
+
+
+gallery = FaceGallery(store=encoding_store)
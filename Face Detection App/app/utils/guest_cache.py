@@ -0,0 +1,60 @@
+import itertools
+
+from app.config import settings
+from app.utils.cache import TTLCache
+
+# email -> reservations as sent to the face websocket
+guest_reservations = TTLCache(settings.reservation_cache_size, settings.reservation_cache_ttl)
+# user_id -> email, so reservation changes can find the entry to drop
+_emails_by_user_id = TTLCache(settings.reservation_cache_size, settings.reservation_cache_ttl)
+# email -> generation, bumped on every invalidation so a lookup that raced one
+# does not cache what it read before it
+_generations = TTLCache(settings.reservation_cache_size, settings.reservation_cache_ttl)
+_next_generation = itertools.count(1)
+
+
+def _serialize(res):
+    return {
+        "id": str(res["_id"]),
+        "room_id": res["room_id"],
+        "check_in_date": res["check_in_date"].isoformat(),
+        "check_out_date": res["check_out_date"].isoformat(),
+        "status": res.get("status", "active")
+    }
+
+
+async def get_guest_reservations(db, email):
+    """Reservations of a recognized guest, hitting Mongo only on a cache miss."""
+    reservations = guest_reservations.get(email)
+    if reservations is not None:
+        return reservations
+
+    generation = _generations.get(email, 0)
+    reservations = []
+    user = await db["users"].find_one({"email": email})
+    if user:
+        user_id = str(user["_id"])
+        _emails_by_user_id.set(user_id, email)  # so an invalidation during the lookup finds it
+        async for res in db["reservations"].find({"user_id": user_id}):
+            reservations.append(_serialize(res))
+
+    if _generations.get(email, 0) == generation:
+        guest_reservations.set(email, reservations)
+        if user:
+            _emails_by_user_id.set(user_id, email)  # live as long as the cached reservations
+    return reservations
+
+
+def invalidate_guest(email=None, user_id=None):
+    """Drop a guest's cached reservations after they changed."""
+    if email is not None:
+        _invalidate(email)
+    if user_id is not None:
+        cached_email = _emails_by_user_id.pop(str(user_id), None)
+        if cached_email is not None:
+            _invalidate(cached_email)
+
+
+def _invalidate(email):
+    _generations.set(email, next(_next_generation))
+    guest_reservations.pop(email)
@@ -0,0 +1,132 @@
+import numpy as np
+
+from app.utils.gallery import FaceGallery
+from app.utils.matcher import pairwise_distances, top_k
+
+
+def medoid_templates(encodings, count):
+    """Pick up to count representative photos (medoids) out of one guest's encodings."""
+    if len(encodings) <= count:
+        return np.array(encodings, dtype=np.float32)
+
+    dists = pairwise_distances(encodings, encodings)
+    # Start from the overall medoid and spread out farthest-first
+    chosen = [int(np.argmin(dists.sum(axis=1)))]
+    while len(chosen) < count:
+        chosen.append(int(np.argmax(dists[:, chosen].min(axis=1))))
+
+    # One k-medoids pass: move each template to the medoid of the photos it covers
+    labels = np.argmin(dists[:, chosen], axis=1)
+    for j in range(count):
+        members = np.flatnonzero(labels == j)
+        if len(members):
+            chosen[j] = int(members[np.argmin(dists[np.ix_(members, members)].sum(axis=1))])
+    return np.array(encodings[chosen], dtype=np.float32)
+
+
+class IdentityTable:
+    """One row per guest (the centroid of their photos) plus a few medoid templates each.
+
+    Kept in sync with the per-photo gallery through its change feed, only
+    recomputing the guests whose photos changed. Exposes snapshot() and
+    subscribe() like FaceGallery, so any face index can be built over it.
+    """
+
+    def __init__(self, source, templates=3):
+        self.source = source
+        self.template_count = templates
+        self.centroids = FaceGallery()
+        self.templates = {}
+        self.rebuild()
+        source.subscribe(self._on_change)
+
+    def __len__(self):
+        return len(self.centroids)
+
+    def snapshot(self):
+        return self.centroids.snapshot()
+
+    def subscribe(self, listener):
+        self.centroids.subscribe(listener)
+
+    def unsubscribe(self, listener):
+        self.centroids.unsubscribe(listener)
+
+    def rebuild(self):
+        """Recompute every guest from the current gallery."""
+        known = self.source.snapshot()
+        if not len(known.emails):
+            self.templates = {}
+            self.centroids.replace([], [], [])
+            return
+        emails, first_rows, owners = np.unique(known.emails.astype(str), return_index=True, return_inverse=True)
+        order = np.argsort(owners, kind="stable")
+        bounds = np.cumsum(np.bincount(owners, minlength=len(emails)))
+
+        centroids, templates = [], {}
+        for i, rows in enumerate(np.split(order, bounds[:-1])):
+            encodings = known.encodings[rows]
+            centroids.append(encodings.mean(axis=0))
+            templates[known.emails[first_rows[i]]] = medoid_templates(encodings, self.template_count)
+
+        self.templates = templates
+        self.centroids.replace(
+            centroids, known.names[first_rows].tolist(), known.emails[first_rows].tolist()
+        )
+
+    def refresh(self, emails):
+        """Recompute only the given guests, e.g. after they enrolled more photos."""
+        known = self.source.snapshot()
+        for email in emails:
+            self.centroids.remove_email(email)
+            rows = self.source.rows_for_email(email)
+            if not rows:
+                self.templates.pop(email, None)
+                continue
+            encodings = known.encodings[rows]
+            self.templates[email] = medoid_templates(encodings, self.template_count)
+            self.centroids.add([encodings.mean(axis=0)], [known.names[rows[0]]], [email])
+
+    def _on_change(self, change):
+        if change.kind == "reload":
+            self.rebuild()
+        else:
+            self.refresh(change.emails)
+
+
+class TwoStageIndex:
+    """Shortlist guests by centroid, then rank the shortlist by their closest template.
+
+    Rows returned refer to the identity table; distances are the refined
+    template distances, so recognition_threshold keeps its meaning.
+    """
+
+    kind = "identity"
+
+    def __init__(self, identities, coarse_index, shortlist=5):
+        self.identities = identities
+        self.coarse_index = coarse_index
+        self.shortlist = shortlist
+
+    def search(self, queries, k=1, known=None):
+        queries = np.asarray(queries, dtype=np.float32).reshape(len(queries), -1)
+        known = self.identities.snapshot() if known is None else known
+        shortlist, _ = self.coarse_index.search(queries, k=max(k, self.shortlist), known=known)
+
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        dists = np.full((len(queries), k), np.inf, dtype=np.float32)
+        guest_templates = self.identities.templates
+        for i, candidates in enumerate(shortlist):
+            candidates = candidates[candidates >= 0]
+            # A guest being rebuilt or refreshed may be missing from the templates the snapshot was taken with
+            candidates = np.array([c for c in candidates if known.emails[c] in guest_templates], dtype=np.int64)
+            if not len(candidates):
+                continue
+            templates = [guest_templates[email] for email in known.emails[candidates]]
+            starts = np.cumsum([0] + [len(t) for t in templates[:-1]])
+            template_dists = pairwise_distances(queries[i], np.concatenate(templates))[0]
+            guest_dists = np.minimum.reduceat(template_dists, starts)[None, :]
+            idx, best = top_k(guest_dists, k)
+            rows[i, :idx.shape[1]] = candidates[idx[0]]
+            dists[i, :idx.shape[1]] = best[0]
+        return rows, dists
@@ -0,0 +1,311 @@
+"""Server-side recognition on RTSP streams and video files, without a browser in the loop.
+
+A VideoIngestor reads frames with cv2.VideoCapture on a thread and runs them
+through a CameraSession, the same pipeline as the face websocket, which
+shrinks each one to the scale it is analysed at before handing it to a
+worker, and
+publishes each result to its subscribers (the /ws/face/streams/{camera_id}
+websocket). Streams drop frames they cannot keep up with. Video files are
+by default processed frame by frame as fast as possible, which doubles as
+an offline benchmark on recorded footage. Run from the "Face Detection App"
+directory:
+
+    python -m app.utils.ingest lobby.mp4 --camera lobby
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import Counter
+
+import cv2
+
+from app.utils.camera_session import CameraSession
+from app.utils.frame_pool import frame_pool
+
+STREAM_PREFIXES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://")
+
+
+def is_stream(source):
+    return str(source).lower().startswith(STREAM_PREFIXES)
+
+
+class StreamPublisher:
+    """Result channel that fans one camera's results out to any number of subscribers.
+
+    Each subscriber has a one-message queue; a slow one only ever sees the
+    newest result.
+    """
+
+    def __init__(self, reservations=True):
+        self.include_reservations = reservations
+        self._subscribers = set()
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def reservations_changed(self, track_id, email, reservations):
+        return True  # subscribers join at any time, so send them every frame
+
+    def retain(self, track_ids):
+        pass
+
+    async def send(self, message):
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+
+class VideoIngestor:
+    """Reads an RTSP URL or video file on a thread and runs its frames through a CameraSession.
+
+    realtime (the default for streams) hands frames over through the
+    session's newest-frame slot and paces files at their native frame
+    rate; otherwise every frame is processed in order. Lost streams are
+    reopened after reconnect_delay seconds until stop() is called.
+    """
+
+    def __init__(self, camera_id, source, db=None, realtime=None, reservations=True, reconnect_delay=2.0):
+        self.camera_id = camera_id
+        self.source = source
+        self.realtime = is_stream(source) if realtime is None else realtime
+        self.reconnect_delay = reconnect_delay
+        self.publisher = StreamPublisher(reservations and db is not None)
+        self.session = CameraSession(db, self.publisher, camera_id, client=source)
+        self.frames_read = 0
+        self.started_at = None
+        self.error = None
+        self._stop = threading.Event()
+        self._queue = None
+        self._reader = None
+        self._capture = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.started_at = time.time()
+        if self.realtime:
+            self._task = asyncio.create_task(self._guard(self._run_session))
+        else:
+            self._queue = asyncio.Queue(maxsize=2)
+            self._task = asyncio.create_task(self._guard(self._consume))
+        self._reader = threading.Thread(target=self._read, args=(loop,), name=f"ingest-{self.camera_id}", daemon=True)
+        self._reader.start()
+
+    async def stop(self, timeout=5.0):
+        self._stop.set()
+        capture = self._capture
+        if capture is not None:
+            capture.release()  # Unblocks a read() stalled on a dead stream
+        if self._reader is not None:
+            await asyncio.to_thread(self._reader.join, timeout)
+            if self._reader.is_alive():
+                print(f"[Ingest Error] camera {self.camera_id}: reader did not stop within {timeout}s")
+                if self._task is not None:
+                    self._task.cancel()
+        if self._task is not None:
+            await self.wait()
+
+    async def wait(self):
+        """Until the source ends or stop() is called."""
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.error = str(e)
+            print(f"[Ingest Error] camera {self.camera_id}: {e}")
+        finally:
+            self.session.close()
+
+    def status(self):
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        return {
+            "camera_id": self.camera_id,
+            "source": self.source,
+            "realtime": self.realtime,
+            "running": self.running,
+            "frames_read": self.frames_read,
+            "frames_processed": self.session.frames_analysed,
+            "fps": round(self.session.frames_analysed / elapsed, 2) if elapsed else 0.0,
+            "error": self.error,
+        }
+
+    async def _guard(self, consumer):
+        try:
+            await consumer()
+        except Exception as e:
+            self.error = str(e)
+            print(f"[Ingest Error] camera {self.camera_id}: {e}")
+            self._stop.set()  # Nobody reads the frames any more, so stop the reader too
+
+    async def _run_session(self):
+        while True:
+            data, skipped = await self.session.slot.get()
+            if data is None:
+                return
+            await self._process(data, skipped)
+
+    async def _consume(self):
+        while True:
+            frame = await self._queue.get()
+            if frame is None:
+                return
+            await self._process(frame, 0)
+
+    async def _process(self, frame, skipped):
+        message = await self.session.process(frame, skipped)
+        if message is not None:
+            message["camera"] = self.camera_id
+            await self.publisher.send(message)
+
+    def _open(self):
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            capture.release()
+            return None
+        self._capture = capture
+        return capture
+
+    def _read(self, loop):
+        try:
+            self._read_frames(loop)
+        except Exception as e:
+            self.error = str(e)
+            print(f"[Ingest Error] camera {self.camera_id}: {e}")
+        finally:
+            if self.realtime:
+                loop.call_soon_threadsafe(self.session.slot.close)
+            else:
+                asyncio.run_coroutine_threadsafe(self._queue.put(None), loop)
+
+    def _read_frames(self, loop):
+        stream = is_stream(self.source)
+        capture = self._open()
+        while capture is None and stream and not self._stop.wait(self.reconnect_delay):
+            capture = self._open()
+        if capture is None:
+            self.error = f"Could not open {self.source}"
+            return
+
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        interval = 1.0 / fps if self.realtime and not stream and fps > 0 else 0.0
+        next_at = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    if not stream:
+                        return  # End of file
+                    print(f"Lost stream {self.camera_id}, reconnecting")
+                    capture.release()
+                    capture = None
+                    while capture is None and not self._stop.wait(self.reconnect_delay):
+                        capture = self._open()
+                    if capture is None:
+                        return
+                    continue
+
+                self.frames_read += 1
+                if self.realtime:
+                    loop.call_soon_threadsafe(self.session.slot.put, frame)
+                else:
+                    # Block until the consumer has room, so no frame of a recording is dropped
+                    queued = asyncio.run_coroutine_threadsafe(self._queue.put(frame), loop)
+                    while True:
+                        try:
+                            queued.result(timeout=0.5)
+                            break
+                        except concurrent.futures.TimeoutError:
+                            if self._stop.is_set():
+                                queued.cancel()
+                                return
+
+                if interval:
+                    next_at += interval
+                    time.sleep(max(0.0, next_at - time.monotonic()))
+        finally:
+            self._capture = None
+            if capture is not None:
+                capture.release()
+
+
+class IngestRegistry:
+    """The server's running ingestors, by camera id."""
+
+    def __init__(self):
+        self._ingestors = {}
+
+    def get(self, camera_id):
+        return self._ingestors.get(camera_id)
+
+    def list(self):
+        return [ingestor.status() for ingestor in self._ingestors.values()]
+
+    async def start(self, camera_id, source, db=None, realtime=None):
+        if camera_id in self._ingestors:
+            await self.stop(camera_id)
+        ingestor = VideoIngestor(camera_id, source, db, realtime)
+        await ingestor.start()
+        self._ingestors[camera_id] = ingestor
+        return ingestor
+
+    async def stop(self, camera_id):
+        ingestor = self._ingestors.pop(camera_id, None)
+        if ingestor is not None:
+            await ingestor.stop()
+        return ingestor
+
+    async def stop_all(self):
+        for camera_id in list(self._ingestors):
+            await self.stop(camera_id)
+
+
+ingestors = IngestRegistry()
+
+
+async def run_file(path, camera_id, realtime=False):
+    """Recognize every frame of a recording and summarize what was seen."""
+    from app.utils.gallery import gallery
+
+    print(f"Loaded {gallery.load()} face encodings into the gallery")
+    ingestor = VideoIngestor(camera_id, path, realtime=realtime)
+    results = ingestor.publisher.subscribe()
+    seen = Counter()
+
+    async def collect():
+        while True:
+            message = await results.get()
+            seen.update(face["name"] for face in message["faces"])
+
+    collector = asyncio.create_task(collect())
+    await ingestor.start()
+    await ingestor.wait()
+    await asyncio.sleep(0)  # let the collector take the last result
+    collector.cancel()
+    frame_pool.shutdown()
+    return ingestor.status(), seen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run face recognition over a video file or stream")
+    parser.add_argument("source", help="video file or rtsp:// URL")
+    parser.add_argument("--camera", default="file")
+    parser.add_argument("--realtime", action="store_true", help="pace files at their frame rate and drop frames")
+    args = parser.parse_args()
+
+    status, seen = asyncio.run(run_file(args.source, args.camera, args.realtime))
+    print(f"Read {status['frames_read']} frames, processed {status['frames_processed']} at {status['fps']} fps")
+    for name, frames in seen.most_common():
+        print(f"  {name}: {frames} frames")
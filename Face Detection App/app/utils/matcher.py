@@ -0,0 +1,73 @@
+import numpy as np
+
+ENCODING_DIM = 128
+
+
+def squared_norms(encodings):
+    """Row-wise squared L2 norms of an (N x 128) encoding matrix."""
+    return np.einsum("ij,ij->i", encodings, encodings)
+
+
+def pairwise_distances(queries, encodings, sq_norms=None):
+    """Euclidean distances between every query and every gallery row in one matmul.
+
+    Uses |q - g|^2 = |q|^2 + |g|^2 - 2 q.g so the gallery side only needs its
+    precomputed squared norms. Returns a float32 (queries x gallery) matrix.
+    """
+    queries = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_DIM)
+    encodings = np.asarray(encodings, dtype=np.float32)
+    if sq_norms is None:
+        sq_norms = squared_norms(encodings)
+
+    dists = queries @ encodings.T
+    dists *= -2.0
+    dists += squared_norms(queries)[:, None]
+    dists += sq_norms[None, :]
+    # Cancellation can leave tiny negatives for near-identical vectors
+    np.maximum(dists, 0.0, out=dists)
+    return np.sqrt(dists, out=dists)
+
+
+def top_k(dists, k=1):
+    """Indices and distances of the k nearest gallery rows for each query, closest first."""
+    k = min(k, dists.shape[1])
+    if k == dists.shape[1]:
+        idx = np.argsort(dists, axis=1)
+    else:
+        idx = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(dists, idx, axis=1), axis=1)
+        idx = np.take_along_axis(idx, order, axis=1)
+    return idx, np.take_along_axis(dists, idx, axis=1)
+
+
+def match_encodings(queries, known_encodings, known_names, known_emails, recognition_threshold,
+                    known_sq_norms=None, index=None, snapshot=None):
+    """Match a batch of face encodings against the gallery.
+
+    Returns parallel lists of names, emails and best distances. Faces whose
+    nearest gallery row is not under the threshold come back as "Unknown".
+    When an index (see app.utils.face_index) is given it picks the nearest
+    rows instead of the exact scan; pass the snapshot the known arrays come
+    from so it searches exactly those rows.
+    """
+    count = len(queries)
+    names, emails, best = ["Unknown"] * count, [None] * count, [None] * count
+    if not count or not len(known_encodings):
+        return names, emails, best
+
+    if index is not None:
+        rows, dists = index.search(queries, k=1, known=snapshot)
+        idx, best_dists = rows[:, 0], dists[:, 0]
+    else:
+        dists = pairwise_distances(queries, known_encodings, known_sq_norms)
+        idx = np.argmin(dists, axis=1)
+        best_dists = dists[np.arange(count), idx]
+
+    for i, (row, dist) in enumerate(zip(idx, best_dists)):
+        if row < 0:
+            continue
+        best[i] = float(dist)
+        if dist < recognition_threshold:
+            names[i] = known_names[row]
+            emails[i] = known_emails[row]
+    return names, emails, best
@@ -0,0 +1,162 @@
+"""Counters and histograms exposed at /metrics in the Prometheus text format.
+
+Recording is a lock, a bisect and a few additions, so it is cheap enough for
+the per-frame path. Metrics live in the serving process; worker processes
+send their stage timings back with each result instead (see
+face_utils.run_timed).
+"""
+import bisect
+import threading
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][slot] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+frame_stage_seconds = registry.histogram(
+    "face_frame_stage_seconds",
+    "Time per face pipeline stage: decode, resize, detect, encode, landmark in the worker; pool, match, db here",
+    ("stage",),
+)
+frames_total = registry.counter(
+    "face_frames_total",
+    "Frames received on face streams by outcome: analysed, gated, throttled, dropped, invalid",
+    ("outcome",),
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "REST request latency by route template",
+    ("method", "route", "status"),
+)
+mongo_commands_total = registry.counter(
+    "mongo_commands_total",
+    "MongoDB commands by name and outcome",
+    ("command", "outcome"),
+)
+mongo_command_seconds = registry.histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command round trip as seen by the driver",
+    ("command",),
+)
+
+password_queue_seconds = registry.histogram(
+    "password_queue_seconds",
+    "Time a bcrypt hash or verify waited for a password pool thread",
+    ("operation",),
+)
+password_hash_seconds = registry.histogram(
+    "password_hash_seconds",
+    "Time a bcrypt hash or verify ran on a password pool thread",
+    ("operation",),
+)
+
+
+def observe_stages(timings):
+    for stage, seconds in timings.items():
+        frame_stage_seconds.observe(seconds, stage=stage)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Counts and times every command the Mongo client sends; pass it as an event listener."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_commands_total.inc(command=event.command_name, outcome="succeeded")
+        mongo_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        mongo_commands_total.inc(command=event.command_name, outcome="failed")
+        mongo_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name)
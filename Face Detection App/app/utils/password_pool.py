@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+from app.utils.metrics import password_hash_seconds, password_queue_seconds
+from app.utils.security import get_password_hash, verify_password
+
+
+class PasswordPool:
+    """Thread pool for bcrypt hashing and verification, kept off the asyncio event loop.
+
+    bcrypt releases the GIL, so threads run on all cores. At most
+    max_pending operations are queued or running at once; further callers
+    wait in run(). The time each spends waiting and hashing is recorded in
+    /metrics.
+    """
+
+    def __init__(self, workers=0, max_pending=0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = None
+
+    def start(self):
+        if self._executor is not None:
+            return
+        workers = self.workers or settings.password_workers or os.cpu_count() or 1
+        max_pending = self.max_pending or settings.password_queue_size or 4 * workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(max_pending)
+        print(f"Started password pool with {workers} threads, {max_pending} pending operations max")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, operation, fn, *args):
+        """Run fn(*args) on a pool thread once a slot is free."""
+        if self._executor is None:
+            self.start()
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            password_queue_seconds.observe(started - submitted, operation=operation)
+            try:
+                return fn(*args)
+            finally:
+                password_hash_seconds.observe(time.perf_counter() - started, operation=operation)
+
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+
+    async def verify(self, plain_password, hashed_password):
+        return await self.run("verify", verify_password, plain_password, hashed_password)
+
+    async def hash(self, password):
+        return await self.run("hash", get_password_hash, password)
+
+
+password_pool = PasswordPool()
@@ -0,0 +1,127 @@
+"""Sampling profiler for a single face stream, producing collapsed stacks.
+
+The output is one "frame;frame;frame count" line per distinct stack, the
+input format of flamegraph.pl and speedscope. Frames are analysed in pool
+workers, so a profiled session has its worker jobs run under run_profiled,
+which samples the worker's own thread and returns the stacks with the
+result. The server's event loop thread (matching, Mongo, websocket I/O) is
+sampled alongside, keeping only the samples taken while this session's
+process() call is running on it, not other sessions or requests interleaved
+on the same loop. Stacks are prefixed "worker" or "server" to tell the two
+apart.
+
+Only Python frames are visible: time spent inside native code (dlib,
+OpenCV, NumPy) is charged to the Python line that made the call, with no
+breakdown below it. The sampler also only runs when it can take the GIL, so
+each sample is weighted by the intervals that passed since the previous one
+to keep the total time under that calling frame in proportion.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+def collapse(frame):
+    """A frame's stack as "file:function;..." from the outermost call in."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples one thread's Python stack every interval seconds on a background thread.
+
+    Native time is attributed to the calling Python frame. Given a set of
+    frames as within, only stacks running inside one of them are kept.
+    """
+
+    def __init__(self, thread_id, interval=0.005, prefix="", within=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.prefix = prefix
+        self.within = within
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+    def _sample(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None and (self.within is None or self._inside(frame)):
+                stack = collapse(frame)
+                self.stacks[f"{self.prefix};{stack}" if self.prefix else stack] += max(1, round((now - last) / self.interval))
+            last = now
+
+
+    def _inside(self, frame):
+        while frame is not None:
+            if frame in self.within:
+                return True
+            frame = frame.f_back
+        return False
+
+
+def run_profiled(interval, fn, *args):
+    """Run fn(*args) while sampling the calling thread; returns (result, stacks)."""
+    sampler = StackSampler(threading.get_ident(), interval, "worker").start()
+    try:
+        result = fn(*args)
+    finally:
+        stacks = sampler.stop()
+    return result, dict(stacks)
+
+
+class SessionProfiler:
+    """Collects stacks for one face session until its deadline passes."""
+
+    def __init__(self, seconds, interval=0.005):
+        self.interval = interval
+        self.deadline = time.monotonic() + seconds
+        self.stacks = Counter()
+        self._frames = set()
+        self._server = StackSampler(threading.get_ident(), interval, "server", within=self._frames)
+
+    @property
+    def active(self):
+        return time.monotonic() < self.deadline
+
+    def start(self):
+        """Start sampling the calling thread, which must be the event loop's."""
+        self._server.start()
+        return self
+
+    @contextmanager
+    def scope(self, frame):
+        """Sample the event loop only while frame (the session's running process() call) is on its stack."""
+        self._frames.add(frame)
+        try:
+            yield
+        finally:
+            self._frames.discard(frame)
+
+    def add(self, stacks):
+        self.stacks.update(stacks)
+
+    def finish(self):
+        """Stop sampling and return the collapsed-stack text."""
+        self.stacks.update(self._server.stop())
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
@@ -0,0 +1,60 @@
+import asyncio
+
+try:
+    import msgpack
+except ImportError:  # optional, JSON only without it
+    msgpack = None
+
+FORMATS = ("json", "msgpack")
+
+
+class ResultChannel:
+    """Sends face websocket results in the format the client negotiated.
+
+    Clients choose with query parameters: format=json (default) or
+    format=msgpack, and reservations=every or reservations=changes. With
+    "changes" a face carries a reservations key only when its track first
+    appears, its identity changes or the guest's reservations differ from
+    the ones last sent, and clients keep the list per track_id. MessagePack defaults to "changes", JSON to "every", which
+    keeps the original payload.
+    """
+
+    def __init__(self, websocket, fmt="json", reservations=None, lock=None):
+        if fmt not in FORMATS:
+            fmt = "json"
+        if fmt == "msgpack" and msgpack is None:
+            print("msgpack is not installed, falling back to JSON results")
+            fmt = "json"
+        self.websocket = websocket
+        self.format = fmt
+        self.changes_only = (reservations or ("changes" if fmt == "msgpack" else "every")) == "changes"
+        self._sent = {}  # track_id -> (email, reservations) the client holds
+        # Channels of cameras multiplexed on one socket share a lock so sends never interleave
+        self._lock = lock or asyncio.Lock()
+
+    @classmethod
+    def negotiate(cls, websocket, lock=None):
+        params = websocket.query_params
+        return cls(websocket, params.get("format", "json"), params.get("reservations"), lock)
+
+    include_reservations = True
+
+    def reservations_changed(self, track_id, email, reservations):
+        """Whether this face's reservations must be sent now; records that they were."""
+        if not self.changes_only:
+            return True
+        if self._sent.get(track_id) == (email, reservations):
+            return False
+        self._sent[track_id] = (email, reservations)
+        return True
+
+    def retain(self, track_ids):
+        """Forget tracks that left the frame, so a returning id starts over."""
+        self._sent = {tid: sent for tid, sent in self._sent.items() if tid in track_ids}
+
+    async def send(self, message):
+        async with self._lock:
+            if self.format == "msgpack":
+                await self.websocket.send_bytes(msgpack.packb(message, use_bin_type=True))
+            else:
+                await self.websocket.send_json(message)
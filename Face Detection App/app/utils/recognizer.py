@@ -0,0 +1,42 @@
+from app.config import settings
+from app.utils.face_index import create_index
+from app.utils.gallery import gallery
+from app.utils.identities import IdentityTable, TwoStageIndex
+from app.utils.matcher import match_encodings
+
+
+class Recognizer:
+    """Ties the gallery to the configured matching strategy and face index.
+
+    "photo" matches against every enrolled photo; "identity" matches against
+    one centroid per guest and then refines over that guest's templates.
+    """
+
+    def __init__(self, source, strategy="photo", index_kind="brute"):
+        self.strategy = strategy
+        if strategy == "identity":
+            self.source = IdentityTable(source, settings.identity_templates)
+            self.index = TwoStageIndex(
+                self.source, create_index(index_kind, self.source), settings.identity_shortlist
+            )
+        elif strategy == "photo":
+            self.source = source
+            self.index = create_index(index_kind, source)
+        else:
+            raise ValueError(f"Unknown match strategy '{strategy}', expected 'photo' or 'identity'")
+
+    def snapshot(self):
+        return self.source.snapshot()
+
+    def match(self, encodings, recognition_threshold=None):
+        """Return (names, emails, distances) for a batch of face encodings."""
+        if recognition_threshold is None:
+            recognition_threshold = settings.recognition_threshold
+        known = self.source.snapshot()
+        return match_encodings(
+            encodings, known.encodings, known.names, known.emails,
+            recognition_threshold, known.sq_norms, self.index, known,
+        )
+
+
+recognizer = Recognizer(gallery, settings.match_strategy, settings.face_index)
@@ -3,6 +3,7 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from app.config import settings
 from app.schemas import TokenData
+from app.utils.user_cache import decode_token, get_user
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
 import app.db as db_module
@@ -33,7 +34,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        payload = decode_token(token, settings.secret_key, settings.algorithm)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -42,7 +43,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
     
     db = db_module.get_database()
-    user = await db["users"].find_one({"email": token_data.email})
+    user = await get_user(db, token_data.email)
     if user is None:
         raise credentials_exception
     return user
\ No newline at end of file
@@ -0,0 +1,109 @@
+import numpy as np
+
+
+def iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    union = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _center(box):
+    return np.array([(box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0])
+
+
+class Track:
+    """One face followed across frames, with the identity from its last detection."""
+
+    def __init__(self, track_id, box, mark, name, email):
+        self.id = track_id
+        self.box = box
+        self.mark = mark  # bounding box of the eye landmarks, used to follow the face
+        self.name = name
+        self.email = email
+
+
+class FaceTracker:
+    """Keeps identities on tracked faces so detection and encoding run only every few frames.
+
+    On detection frames fresh boxes are matched to existing tracks by IoU
+    (falling back to nearest centre) and identities are refreshed. On the
+    frames in between only eye landmarks are computed for the tracked boxes,
+    and each box is shifted by how far its eyes moved. A track whose box
+    jumps too far is treated as lost and forces a detection.
+    """
+
+    def __init__(self, detect_every=5, iou_threshold=0.3):
+        self.detect_every = detect_every
+        self.iou_threshold = iou_threshold
+        self.tracks = []
+        self._next_id = 0
+        self._since_detection = 0
+        self._lost = False
+
+    def needs_detection(self):
+        return (
+            not self.tracks
+            or self._lost
+            or self._since_detection >= self.detect_every - 1
+        )
+
+    def boxes(self):
+        return [track.box for track in self.tracks]
+
+    def update(self, locs, marks, names, emails):
+        """Take a detection frame's results; returns tracks in detection order."""
+        matches = self._match(locs)
+        tracks = []
+        for i, (box, mark, name, email) in enumerate(zip(locs, marks, names, emails)):
+            track = matches.get(i)
+            if track is None:
+                track = Track(self._next_id, box, mark, name, email)
+                self._next_id += 1
+            track.box, track.mark, track.name, track.email = box, mark, name, email
+            tracks.append(track)
+
+        self.tracks = tracks
+        self._since_detection = 0
+        self._lost = False
+        return tracks
+
+    def follow(self, marks):
+        """Take a landmark-only frame's landmark boxes for the tracked faces."""
+        for track, mark in zip(self.tracks, marks):
+            shift = [new - old for new, old in zip(mark, track.mark)]
+            box = tuple(int(v + d) for v, d in zip(track.box, shift))
+            # Eye boxes are thin, so judge the jump on the face box instead
+            if iou(track.box, box) < self.iou_threshold:
+                self._lost = True
+            track.box, track.mark = box, mark
+        self._since_detection += 1
+        return self.tracks
+
+    def _match(self, locs):
+        """Greedily pair detections with tracks: best IoU first, then nearest centre."""
+        matches, free = {}, list(self.tracks)
+        pairs = sorted(
+            ((iou(box, track.box), i, track) for i, box in enumerate(locs) for track in free),
+            key=lambda pair: pair[0],
+            reverse=True,
+        )
+        for overlap, i, track in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if i not in matches and track in free:
+                matches[i] = track
+                free.remove(track)
+
+        for i, box in enumerate(locs):
+            if i in matches or not free:
+                continue
+            size = max(box[2] - box[0], box[1] - box[3])
+            dists = [np.linalg.norm(_center(box) - _center(track.box)) for track in free]
+            nearest = int(np.argmin(dists))
+            # Only a face that moved less than its own size is the same guest
+            if dists[nearest] < size:
+                matches[i] = free.pop(nearest)
+        return matches
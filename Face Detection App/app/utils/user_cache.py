@@ -0,0 +1,49 @@
+import hashlib
+import time
+
+from jose import jwt
+
+from app.config import settings
+from app.utils.cache import TTLCache
+
+# token subject (email) -> user document, for get_current_user
+users_by_email = TTLCache(settings.user_cache_size, settings.user_cache_ttl)
+# hash of key, algorithm and token -> verified claims, kept until the token expires
+token_claims = TTLCache(settings.user_cache_size, settings.user_cache_ttl)
+
+
+def _token_key(token, secret_key, algorithm):
+    # The key is part of the hash so a token verified under one key never passes for another
+    return hashlib.sha256(f"{algorithm}:{secret_key}:{token}".encode()).hexdigest()
+
+
+def decode_token(token, secret_key, algorithm):
+    """jwt.decode, verifying each distinct token's signature only once.
+
+    Claims are cached no longer than the token is valid, so an expired token
+    falls through to jwt.decode and fails there.
+    """
+    key = _token_key(token, secret_key, algorithm)
+    claims = token_claims.get(key)
+    if claims is None:
+        claims = jwt.decode(token, secret_key, algorithms=[algorithm])
+        expires = claims.get("exp")
+        ttl = settings.user_cache_ttl if expires is None else expires - time.time()
+        token_claims.set(key, claims, ttl=max(0.0, ttl))
+    return claims
+
+
+async def get_user(db, email):
+    """User document by email, hitting Mongo only on a cache miss; None if there is none."""
+    user = users_by_email.get(email)
+    if user is None:
+        user = await db["users"].find_one({"email": email})
+        if user is None:
+            return None
+        users_by_email.set(email, user)
+    return dict(user)  # callers add fields to it
+
+
+def invalidate_user(email):
+    """Drop a cached user document after it changed."""
+    users_by_email.pop(email)
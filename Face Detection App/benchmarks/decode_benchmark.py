@@ -0,0 +1,95 @@
+"""Measure per-frame decode and preprocessing cost of the face websocket pipeline.
+
+Compares the old path (full-size JPEG decode, resize, fresh RGB copy) with
+the current one (reduced-size JPEG decode, RGB conversion into a reused
+buffer) on the same frames, reporting milliseconds and bytes allocated per
+frame. With --full it also times analyze_jpeg end to end, which needs
+face_recognition and a --image with a face in it.
+
+Run from the "Face Detection App" directory:
+
+    python -m benchmarks.decode_benchmark --sizes 640x480 1920x1080 3840x2160 --scale 0.25
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from app.utils.face_utils import _buffer, decode_for_scale
+
+
+def synthetic_jpeg(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = cv2.resize(rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+    frame = cv2.add(frame, rng.integers(0, 12, frame.shape, dtype=np.uint8))
+    return cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+
+def legacy_preprocess(data, frame_scale):
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    small = cv2.resize(frame, (0, 0), fx=frame_scale, fy=frame_scale)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+
+
+def reduced_preprocess(data, frame_scale):
+    frame, decoded_scale = decode_for_scale(data, frame_scale)
+    small = frame
+    resize = frame_scale / decoded_scale
+    if abs(resize - 1.0) > 1e-3:
+        height, width = frame.shape[:2]
+        size = (max(1, round(width * resize)), max(1, round(height * resize)))
+        small = cv2.resize(frame, size, dst=_buffer("small", (size[1], size[0], 3)))
+    return cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=_buffer("rgb", small.shape))
+
+
+def measure(fn, data, frame_scale, repeats):
+    fn(data, frame_scale)  # warm up buffers and libjpeg
+    began = time.perf_counter()
+    for _ in range(repeats):
+        fn(data, frame_scale)
+    elapsed = (time.perf_counter() - began) / repeats
+
+    tracemalloc.start()
+    for _ in range(repeats):
+        fn(data, frame_scale)
+    _, peak = tracemalloc.get_traced_memory()
+    allocated = sum(stat.size for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    return elapsed * 1000, peak, allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080", "3840x2160"])
+    parser.add_argument("--scale", type=float, default=0.25, help="frame_scale")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--image", help="use this photo, resized to each size, instead of a synthetic frame")
+    parser.add_argument("--full", action="store_true", help="also time analyze_jpeg end to end")
+    args = parser.parse_args()
+
+    source = cv2.imread(args.image) if args.image else None
+    for size in args.sizes:
+        width, height = map(int, size.split("x"))
+        if source is not None:
+            data = cv2.imencode(".jpg", cv2.resize(source, (width, height)))[1].tobytes()
+        else:
+            data = synthetic_jpeg(width, height)
+
+        print(f"{size} at scale {args.scale} ({len(data) // 1024} KiB JPEG)")
+        for label, fn in (("full decode", legacy_preprocess), ("reduced decode", reduced_preprocess)):
+            ms, peak, allocated = measure(fn, data, args.scale, args.repeats)
+            print(f"  {label:15s} {ms:7.2f} ms/frame  peak {peak / 1024:8.0f} KiB  retained {allocated / 1024:6.0f} KiB")
+
+        if args.full:
+            from app.utils.face_utils import analyze_jpeg
+
+            began = time.perf_counter()
+            for _ in range(args.repeats):
+                analyze_jpeg(data, args.scale, "hog")
+            print(f"  {'analyze_jpeg':15s} {(time.perf_counter() - began) / args.repeats * 1000:7.2f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
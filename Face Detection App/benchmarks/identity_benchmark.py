@@ -0,0 +1,79 @@
+"""Compare per-guest centroid/template matching with the per-photo baseline.
+
+Uses the same synthetic gallery as index_benchmark and reports gallery rows,
+query latency, identification accuracy on enrolled guests and false accepts
+on strangers at recognition_threshold, for both strategies.
+
+Run from the "Face Detection App" directory:
+
+    python -m benchmarks.identity_benchmark --guests 5000 --photos 10 --templates 3
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.face_index import BruteForceIndex
+from app.utils.gallery import FaceGallery
+from app.utils.identities import IdentityTable, TwoStageIndex
+from app.utils.matcher import match_encodings, pairwise_distances
+from benchmarks.index_benchmark import synthetic_gallery, synthetic_queries
+
+
+def evaluate(label, source, index, queries, truth, threshold, batch):
+    known = source.snapshot()
+    found, elapsed = [], []
+    for start in range(0, len(queries), batch):
+        began = time.perf_counter()
+        _, emails, _ = match_encodings(
+            queries[start:start + batch], known.encodings, known.names, known.emails,
+            threshold, known.sq_norms, index,
+        )
+        elapsed.append(time.perf_counter() - began)
+        found.extend(emails)
+
+    found = np.array(found, dtype=object)
+    enrolled = truth != None  # noqa: E711 - elementwise comparison
+    accuracy = np.mean(found[enrolled] == truth[enrolled])
+    false_accepts = np.mean(found[~enrolled] != None)  # noqa: E711
+    print(
+        f"{label:<10} rows {len(known.encodings):>8}  p50 {np.median(elapsed) * 1e3:7.3f} ms"
+        f"  accuracy {accuracy:6.4f}  false accepts {false_accepts:6.4f}"
+    )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guests", type=int, default=5000)
+    parser.add_argument("--photos", type=int, default=10, help="encodings per guest")
+    parser.add_argument("--templates", type=int, default=3, help="medoid templates per guest")
+    parser.add_argument("--shortlist", type=int, default=5, help="guests refined after the centroid pass")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=4, help="faces per frame")
+    parser.add_argument("--threshold", type=float, default=0.6, help="recognition_threshold")
+    args = parser.parse_args()
+
+    mean, centers, encodings, emails = synthetic_gallery(args.guests, args.photos)
+    queries = synthetic_queries(mean, centers, args.queries, seed=2)
+    # Recover ground truth: strangers are far from every center
+    center_dists = pairwise_distances(queries, centers)
+    nearest = np.argmin(center_dists, axis=1)
+    near_enough = center_dists[np.arange(len(queries)), nearest] < 0.5
+    truth = np.where(near_enough, np.array([f"guest{i}@example.com" for i in nearest], dtype=object), None)
+
+    photos = FaceGallery()
+    photos.add(encodings, emails, emails)
+
+    began = time.perf_counter()
+    identities = IdentityTable(photos, args.templates)
+    print(f"identity table built in {time.perf_counter() - began:.2f} s")
+
+    baseline = evaluate("per-photo", photos, BruteForceIndex(photos), queries, truth, args.threshold, args.batch)
+    two_stage = TwoStageIndex(identities, BruteForceIndex(identities), args.shortlist)
+    refined = evaluate("identity", identities, two_stage, queries, truth, args.threshold, args.batch)
+    print(f"agreement with per-photo decisions: {np.mean(baseline == refined):.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Compare face index implementations against exact brute-force search.
+
+Builds a synthetic gallery shaped like face_recognition encodings (photos of
+the same guest ~0.35 apart, different guests ~0.9 apart) and reports, for
+each index, query latency and how often its accept/reject decision and
+matched guest at recognition_threshold agree with the exact scan.
+
+Run from the "Face Detection App" directory:
+
+    python -m benchmarks.index_benchmark --guests 20000 --photos 5 --nprobe 1 4 8 16
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.face_index import BallTree, BallTreeIndex, BruteForceIndex, IVFIndex
+from app.utils.gallery import FaceGallery
+from app.utils.matcher import ENCODING_DIM
+
+
+def synthetic_gallery(guests, photos, seed=0):
+    rng = np.random.default_rng(seed)
+    mean = rng.normal(0, 0.08, ENCODING_DIM)
+    centers = mean + rng.normal(0, 0.055, (guests, ENCODING_DIM))
+    encodings = np.repeat(centers, photos, axis=0) + rng.normal(0, 0.022, (guests * photos, ENCODING_DIM))
+    emails = np.repeat([f"guest{i}@example.com" for i in range(guests)], photos)
+    return mean, centers, encodings.astype(np.float32), emails
+
+
+def synthetic_queries(mean, centers, count, unknown_ratio=0.2, seed=1):
+    rng = np.random.default_rng(seed)
+    known = rng.integers(0, len(centers), count)
+    queries = centers[known] + rng.normal(0, 0.022, (count, ENCODING_DIM))
+    strangers = rng.random(count) < unknown_ratio
+    queries[strangers] = mean + rng.normal(0, 0.055, (strangers.sum(), ENCODING_DIM))
+    return queries.astype(np.float32)
+
+
+def timed_search(index, queries, batch):
+    rows, dists, elapsed = [], [], []
+    for start in range(0, len(queries), batch):
+        began = time.perf_counter()
+        r, d = index.search(queries[start:start + batch], k=1)
+        elapsed.append(time.perf_counter() - began)
+        rows.append(r[:, 0])
+        dists.append(d[:, 0])
+    return np.concatenate(rows), np.concatenate(dists), np.array(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guests", type=int, default=20000)
+    parser.add_argument("--photos", type=int, default=5, help="encodings per guest")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=4, help="faces per frame")
+    parser.add_argument("--threshold", type=float, default=0.6, help="recognition_threshold")
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    mean, centers, encodings, emails = synthetic_gallery(args.guests, args.photos)
+    queries = synthetic_queries(mean, centers, args.queries)
+
+    gallery = FaceGallery()
+    gallery.add(encodings, emails, emails)
+    known = gallery.snapshot()
+    print(f"gallery: {len(gallery)} encodings, {args.queries} queries in batches of {args.batch}")
+
+    exact_rows, exact_dists, exact_time = timed_search(BruteForceIndex(gallery), queries, args.batch)
+    exact_accept = exact_dists < args.threshold
+    exact_emails = np.where(exact_accept, known.emails[exact_rows], None)
+
+    def report(label, index):
+        rows, dists, elapsed = timed_search(index, queries, args.batch)
+        accept = dists < args.threshold
+        found = np.where(accept, known.emails[np.maximum(rows, 0)], None)
+        recall = np.mean(rows == exact_rows)
+        agree = np.mean(found == exact_emails)
+        print(
+            f"{label:<22} p50 {np.median(elapsed) * 1e3:7.3f} ms  p95 {np.percentile(elapsed, 95) * 1e3:7.3f} ms"
+            f"  recall@1 {recall:6.4f}  decision agreement {agree:6.4f}"
+        )
+
+    print(
+        f"{'brute':<22} p50 {np.median(exact_time) * 1e3:7.3f} ms  p95 {np.percentile(exact_time, 95) * 1e3:7.3f} ms"
+        f"  accepted {exact_accept.mean():.2%}"
+    )
+    for nprobe in args.nprobe:
+        index = IVFIndex(gallery, nlist=args.nlist, nprobe=nprobe)
+        began = time.perf_counter()
+        index.train()
+        print(f"ivf trained {len(index.centroids)} lists in {time.perf_counter() - began:.2f} s")
+        report(f"ivf nprobe={nprobe}", index)
+    if BallTree is not None:
+        index = BallTreeIndex(gallery)
+        index.search(queries[:1])  # build outside the timed loop
+        report("balltree", index)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Load test: login throughput against face websocket latency on a running server.
+
+For each --concurrency level, that many clients log in back to back for
+--duration seconds while one camera streams --frame over /ws/face at
+--fps, waiting for each result before sending the next frame. Reports
+logins per second and login latency next to the websocket round trip.
+With bcrypt on the password pool, logins per second should grow with
+the level up to the number of cores while the websocket p95 stays near
+the level-0 (no logins) baseline. Use a frame with a face in it, so the
+motion gate does not answer in place of the pipeline.
+
+Run from the "Face Detection App" directory against an existing account:
+
+    python -m benchmarks.login_load --url http://localhost:8000 --email guest@example.com --password secret --frame face.jpg
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+import requests
+import websockets
+
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    if not len(values):
+        return None
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def login_worker(url, email, password, deadline, latencies, failures):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        began = time.perf_counter()
+        response = session.post(f"{url}/api/auth/login", json={"email": email, "password": password})
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - began)
+        else:
+            failures.append(response.status_code)
+
+
+async def stream_frames(ws_url, frame, fps, deadline, timeout):
+    """Send frame at fps until deadline; returns (round trips in seconds, frames without a reply)."""
+    latencies, timeouts = [], 0
+    interval = 1.0 / fps
+    async with websockets.connect(ws_url, max_size=None) as websocket:
+        while time.monotonic() < deadline:
+            began = time.perf_counter()
+            await websocket.send(frame)
+            try:
+                await asyncio.wait_for(websocket.recv(), timeout)
+                latencies.append(time.perf_counter() - began)
+            except asyncio.TimeoutError:
+                timeouts += 1  # Dropped or throttled frames get no reply
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - began)))
+    return latencies, timeouts
+
+
+async def run_level(args, frame, concurrency):
+    deadline = time.monotonic() + args.duration
+    login_latencies, failures = [], []
+    threads = [
+        threading.Thread(
+            target=login_worker,
+            args=(args.url, args.email, args.password, deadline, login_latencies, failures),
+            daemon=True,
+        )
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    ws_url = args.url.replace("http", "ws", 1) + "/ws/face"
+    ws_latencies, timeouts = await stream_frames(ws_url, frame, args.fps, deadline, args.timeout)
+    for thread in threads:
+        await asyncio.to_thread(thread.join)
+
+    return {
+        "concurrency": concurrency,
+        "logins_per_second": round(len(login_latencies) / args.duration, 2),
+        "login_failures": len(failures),
+        "login_ms": percentiles(login_latencies),
+        "frames": len(ws_latencies),
+        "frame_timeouts": timeouts,
+        "websocket_ms": percentiles(ws_latencies),
+    }
+
+
+async def run(args):
+    with open(args.frame, "rb") as f:
+        frame = f.read()
+    results = []
+    for concurrency in [0] + [level for level in args.concurrency if level]:
+        result = await run_level(args, frame, concurrency)
+        results.append(result)
+        ws = result["websocket_ms"] or {}
+        print(
+            f"{concurrency:>3} clients: {result['logins_per_second']:7.2f} logins/s"
+            f" ({result['login_failures']} failed), websocket p50 {ws.get('p50', np.nan):8.2f}"
+            f" p95 {ws.get('p95', np.nan):8.2f} p99 {ws.get('p99', np.nan):8.2f} ms,"
+            f" {result['frame_timeouts']} frames unanswered"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True, help="an existing account to log in as")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--frame", required=True, help="JPEG streamed over /ws/face")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="login clients per level")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--fps", type=float, default=5.0, help="frames per second sent over the websocket")
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for a frame's result")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""End-to-end recognition benchmark over recorded frames and clips.
+
+Runs the websocket's analysis pipeline in-process over every image and video
+in --frames. The gallery holds the guests enrolled from --enroll
+(<label>/<photo>.jpg), padded with synthetic distractors up to
+--gallery-size rows. Reports fps and p50/p95/p99 latency per stage:
+decode, resize, detect, encode, landmark, match and, with --mongo, the
+reservation lookup. Frames are scored against labels taken from --labels
+(CSV with file,label columns) or from each file's parent directory;
+"unknown" marks frames in which nobody enrolled appears. --output writes
+everything as JSON, to compare across commits.
+
+Run from the "Face Detection App" directory:
+
+    python -m benchmarks.pipeline_benchmark --frames clips/ --enroll guests/ --gallery-size 10000 --output run.json
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from app.utils.encoding_store import EncodingStore
+from app.utils.face_utils import analyze_image, analyze_jpeg, encode_face
+from app.utils.gallery import FaceGallery
+from app.utils.recognizer import Recognizer
+from benchmarks.index_benchmark import synthetic_gallery
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+STAGES = ("decode", "resize", "detect", "encode", "landmark", "match", "db")
+
+
+def enroll(directory, detection_method):
+    """Encode <label>/<photo> images; the label is used as both name and email."""
+    encodings, labels = [], []
+    for label in sorted(os.listdir(directory)):
+        folder = os.path.join(directory, label)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            image = cv2.imread(os.path.join(folder, filename))
+            encoding = encode_face(image, detection_method) if image is not None else None
+            if encoding is None:
+                print(f"No face in enrollment photo {label}/{filename}")
+                continue
+            encodings.append(encoding)
+            labels.append(label)
+    return encodings, labels
+
+
+def build_gallery(enrolled, labels, size, photos):
+    """Real enrollments plus synthetic distractors; returns (gallery, seconds to load it from a store)."""
+    encodings, names = list(enrolled), list(labels)
+    missing = max(0, size - len(encodings))
+    if missing:
+        _, _, fake, fake_emails = synthetic_gallery(-(-missing // photos), photos, seed=7)
+        encodings.extend(fake[:missing])
+        names.extend(fake_emails[:missing])
+
+    if not encodings:
+        return FaceGallery(), 0.0
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = EncodingStore(directory)
+        store.append(encodings, [{"name": n, "email": n, "photo_url": None} for n in names])
+        gallery = FaceGallery(store=store)
+        began = time.perf_counter()
+        gallery.load()
+        loaded = time.perf_counter() - began
+        # Keep the rows after the temporary files are gone
+        snapshot = gallery.snapshot()
+        gallery.replace(np.array(snapshot.encodings), list(snapshot.names), list(snapshot.emails))
+    return gallery, loaded
+
+
+def read_labels(path):
+    if not path:
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["file"]: row["label"] for row in csv.DictReader(f)}
+
+
+def iter_frames(directory, labels, every, limit):
+    """Yield (name, label, kind, data) with kind "jpeg" (bytes) or "image" (decoded) plus decode seconds."""
+    count = 0
+    for root, _, files in sorted(os.walk(directory)):
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            relative = os.path.relpath(path, directory)
+            parent = os.path.dirname(relative)
+            label = labels.get(relative, parent.split(os.sep)[0] if parent else None)
+            extension = os.path.splitext(filename)[1].lower()
+
+            if extension in IMAGE_EXTENSIONS:
+                with open(path, "rb") as f:
+                    yield relative, label, "jpeg", f.read(), 0.0
+                count += 1
+            elif extension in VIDEO_EXTENSIONS:
+                capture = cv2.VideoCapture(path)
+                index = 0
+                while limit is None or count < limit:
+                    began = time.perf_counter()
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    if index % every == 0:
+                        yield f"{relative}#{index}", label, "image", frame, time.perf_counter() - began
+                        count += 1
+                    index += 1
+                capture.release()
+            if limit is not None and count >= limit:
+                return
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    if not len(values):
+        return None
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    enrolled, labels = enroll(args.enroll, args.method) if args.enroll else ([], [])
+    gallery, load_time = build_gallery(enrolled, labels, args.gallery_size, args.photos)
+    recognizer = Recognizer(gallery, args.strategy, args.index)
+    print(f"gallery: {len(gallery)} rows ({len(enrolled)} enrolled), loaded in {load_time * 1000:.1f} ms")
+
+    db = None
+    if args.mongo:
+        from app.db import connect_to_mongo, get_database
+        from app.utils.guest_cache import get_guest_reservations, guest_reservations
+
+        await connect_to_mongo()
+        db = get_database()
+
+    stages = defaultdict(list)
+    totals, scored = [], defaultdict(int)
+    for name, label, kind, data, decode_time in iter_frames(args.frames, read_labels(args.labels), args.every, args.max_frames):
+        timings = {"decode": decode_time}
+        began = time.perf_counter()
+        analyze = analyze_jpeg if kind == "jpeg" else analyze_image
+        analysis = analyze(data, args.scale, args.method, None, timings)
+        if analysis is None:
+            print(f"Could not decode {name}")
+            continue
+        _, encs, _, _, _ = analysis
+
+        started = time.perf_counter()
+        names, emails, _ = recognizer.match(encs, args.threshold)
+        timings["match"] = time.perf_counter() - started
+
+        if db is not None:
+            started = time.perf_counter()
+            for email in filter(None, emails):
+                if args.no_cache:
+                    guest_reservations.clear()
+                await get_guest_reservations(db, email)
+            timings["db"] = time.perf_counter() - started
+        totals.append(time.perf_counter() - began + decode_time)
+        for stage, seconds in timings.items():
+            stages[stage].append(seconds)
+
+        if label is None:
+            continue
+        known = {n for n in names if n != "Unknown"}
+        scored["frames"] += 1
+        if label.lower() == "unknown":
+            scored["strangers"] += 1
+            scored["false_accepts"] += bool(known)
+        else:
+            scored["guests"] += 1
+            scored["detected"] += bool(names)
+            scored["correct"] += label in known
+            scored["false_accepts"] += bool(known - {label})
+
+    frames = len(totals)
+    results = {
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "gallery_rows": len(gallery),
+        "gallery_load_ms": round(load_time * 1000, 3),
+        "frames": frames,
+        "fps": round(frames / sum(totals), 2) if frames else 0.0,
+        "total_ms": percentiles(totals),
+        "stages_ms": {stage: percentiles(stages[stage]) for stage in STAGES if stages[stage]},
+        "accuracy": {
+            "labelled_frames": scored["frames"],
+            "identification": scored["correct"] / scored["guests"] if scored["guests"] else None,
+            "detection_rate": scored["detected"] / scored["guests"] if scored["guests"] else None,
+            "false_accept_rate": scored["false_accepts"] / scored["frames"] if scored["frames"] else None,
+        },
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", required=True, help="directory of images and/or video clips")
+    parser.add_argument("--labels", help="CSV with file (relative to --frames) and label columns")
+    parser.add_argument("--enroll", help="directory of <label>/<photo> enrollment images")
+    parser.add_argument("--gallery-size", type=int, default=0, help="pad the gallery with synthetic rows")
+    parser.add_argument("--photos", type=int, default=5, help="synthetic photos per distractor guest")
+    parser.add_argument("--scale", type=float, default=0.25, help="frame_scale")
+    parser.add_argument("--method", default="hog", help="detection_method")
+    parser.add_argument("--threshold", type=float, default=0.6, help="recognition_threshold")
+    parser.add_argument("--strategy", default="photo", help="match_strategy")
+    parser.add_argument("--index", default="brute", help="face_index")
+    parser.add_argument("--every", type=int, default=1, help="use every Nth video frame")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--mongo", action="store_true", help="time reservation lookups against settings.mongo_url")
+    parser.add_argument("--no-cache", action="store_true", help="with --mongo, bypass the reservation cache")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{results['frames']} frames at {results['fps']} fps, total {results['total_ms']}")
+    for stage, summary in results["stages_ms"].items():
+        print(f"  {stage:<9} p50 {summary['p50']:8.2f}  p95 {summary['p95']:8.2f}  p99 {summary['p99']:8.2f} ms")
+    print(f"accuracy: {results['accuracy']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,17 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.db import connect_to_mongo, close_mongo_connection
+from app.db import connect_to_mongo, close_mongo_connection, get_database
 from app.routes import auth, rooms, reservations, admin, face, images
+from app.utils.enrollment import enrollment_jobs
+from app.utils.frame_pool import frame_pool
+from app.utils.gallery import gallery
+from app.utils.ingest import ingestors
+from app.utils.metrics import http_request_seconds, registry
+from app.utils.password_pool import password_pool
+from app.utils.stats import ensure_indexes
 
 app = FastAPI(title="Hotel Management API")
 
@@ -18,6 +27,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status_code = 500  # Unhandled errors count as the 500 the client gets
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series count bounded
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status_code),
+        )
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(rooms.router, prefix="/api/rooms", tags=["Rooms"])
@@ -30,11 +57,24 @@ app.include_router(images.router, prefix="/api/images", tags=["Images"])
 async def startup_event():
     await connect_to_mongo()
     print("Connected to MongoDB")
+    await ensure_indexes(get_database())
+    print(f"Loaded {gallery.load()} face encodings into the gallery")
+    frame_pool.start()
+    password_pool.start()
+    await enrollment_jobs.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await ingestors.stop_all()
+    await enrollment_jobs.stop()
+    frame_pool.shutdown()
+    password_pool.shutdown()
     await close_mongo_connection()
 
 @app.get("/")
 def read_root():
-    return {"message": "Hotel Management API"}
\ No newline at end of file
+    return {"message": "Hotel Management API"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -5,10 +5,27 @@ import { useRouter } from 'next/navigation';
 import SignupForm from '@/app/components/auth/SignupForm';
 import { authApi } from '@/app/api/auth';
 
+const ENROLLMENT_POLL_MS = 1500;
+const ENROLLMENT_TIMEOUT_MS = 120000;
+
+// Face photos are encoded in the background after the account is created; wait for the outcome
+async function waitForEnrollment(jobId: string, token: string): Promise<any> {
+  const deadline = Date.now() + ENROLLMENT_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const job = await authApi.enrollmentStatus(jobId, token);
+    if (job.status === 'completed' || job.status === 'failed') {
+      return job;
+    }
+    await new Promise((resolve) => setTimeout(resolve, ENROLLMENT_POLL_MS));
+  }
+  return null;
+}
+
 export default function SignupPage() {
   const [error, setError] = useState('');
   const [success, setSuccess] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
+  const [enrolling, setEnrolling] = useState(false);
   const router = useRouter();
 
   const handleSignup = async (data: {
@@ -22,7 +39,13 @@ export default function SignupPage() {
     setError('');
     
     try {
-      await authApi.register(data);
+      const registered = await authApi.register(data);
+      setEnrolling(true);
+      const job = await waitForEnrollment(registered.enrollment_job_id, registered.access_token);
+      if (job?.status === 'failed') {
+        setError(job.error || 'No face could be registered from your photos. Please try again.');
+        return;
+      }
       setSuccess(true);
       
       // Redirect to login after successful signup
@@ -32,6 +55,7 @@ export default function SignupPage() {
     } catch (err: any) {
       setError(err.response?.data?.detail || 'Signup failed. Please try again.');
     } finally {
+      setEnrolling(false);
       setIsLoading(false);
     }
   };
@@ -50,6 +74,20 @@ export default function SignupPage() {
     );
   }
 
+  if (enrolling) {
+    return (
+      <div className="min-h-screen flex items-center justify-center bg-gradient-to-r from-blue-500 to-purple-600 p-4">
+        <div className="bg-white p-8 rounded-xl shadow-2xl w-full max-w-md text-center">
+          <h1 className="text-3xl font-bold text-center mb-6">Registering Your Face</h1>
+          <p className="mb-6">Checking your photos, this takes a few seconds...</p>
+          <div className="flex justify-center">
+            <div className="w-12 h-12 border-4 border-blue-600 border-t-transparent rounded-full animate-spin"></div>
+          </div>
+        </div>
+      </div>
+    );
+  }
+
   return (
     <div className="min-h-screen flex items-center justify-center bg-gradient-to-r from-indigo-500 to-purple-600 p-4">
       <SignupForm 
@@ -13,6 +13,7 @@ interface Reservation {
 }
 
 interface FaceResult {
+  track_id: number;
   name: string;
   email: string;
   status: 'Live' | 'Not Live';
@@ -20,6 +21,23 @@ interface FaceResult {
   reservations: Reservation[];
 }
 
+interface FrameSettings {
+  scale: number;
+  detection_method: string;
+  frame_skip: number;
+}
+
+// Sent with reservations=changes: reservations only arrive when a track's identity changes
+interface WireFace extends Omit<FaceResult, 'reservations'> {
+  reservations?: Reservation[];
+}
+
+interface FrameResult {
+  faces: WireFace[];
+  skipped: number;
+  settings: FrameSettings;
+}
+
 export default function CheckInPage() {
   const [results, setResults] = useState<FaceResult[]>([]);
   const [isConnected, setIsConnected] = useState(false);
@@ -41,6 +59,7 @@ export default function CheckInPage() {
   const lastFpsUpdateRef = useRef(0);
   const streamRef = useRef<MediaStream | null>(null);
   const cameraIntervalRef = useRef<NodeJS.Timeout | null>(null);
+  const reservationsRef = useRef<Map<number, Reservation[]>>(new Map());
 
   useEffect(() => {
     return () => {
@@ -61,7 +80,8 @@ export default function CheckInPage() {
       }
 
       const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-      const wsUrl = `${protocol}//${window.location.hostname}:8000/ws/face`;
+      const wsUrl = `${protocol}//${window.location.hostname}:8000/ws/face?reservations=changes`;
+      reservationsRef.current = new Map();
       wsRef.current = new WebSocket(wsUrl);
 
       wsRef.current.onopen = () => {
@@ -72,7 +92,18 @@ export default function CheckInPage() {
 
       wsRef.current.onmessage = (event) => {
         try {
-          const data: FaceResult[] = JSON.parse(event.data);
+          const { faces }: FrameResult = JSON.parse(event.data);
+          const known = reservationsRef.current;
+          const data: FaceResult[] = faces.map((face) => {
+            if (face.reservations) {
+              known.set(face.track_id, face.reservations);
+            }
+            return { ...face, reservations: known.get(face.track_id) ?? [] };
+          });
+          const active = new Set(faces.map((face) => face.track_id));
+          known.forEach((_, trackId) => {
+            if (!active.has(trackId)) known.delete(trackId);
+          });
           setResults(data);
           frameCountRef.current += 1;
 
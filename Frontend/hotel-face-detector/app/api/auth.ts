@@ -55,6 +55,20 @@ export const authApi = {
     }
   },
 
+  enrollmentStatus: async (jobId: string, token: string): Promise<any> => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/api/auth/enrollment/${jobId}`, {
+        headers: {
+          Authorization: `Bearer ${token}`
+        }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Enrollment status failed:', error);
+      throw error;
+    }
+  },
+
   logout: async (): Promise<void> => {
     return Promise.resolve();
   }